@@ -0,0 +1,295 @@
+"""
+本地的小红书替身站点，用于离线基准测试：提供首页、搜索页、search/notes 接口、user/me 接口、评论接口、feed接口、详情页、
+安全验证页、图片资源，以及钉钉机器人webhook的替身。
+所有数据由关键词与页码确定性地生成；若 fixtures 目录下有录制的 search_notes.json，则以其中的items为模板。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+SEARCH_PAGE = '''<html><head><title>{keyword} - 小红书搜索</title></head><body>
+<ul>{login}</ul>
+<script>
+fetch('/api/sns/web/v1/search/notes', {{
+    method: 'POST',
+    credentials: 'include',
+    headers: {{'content-type': 'application/json;charset=UTF-8', 'x-s': 'bench-sign', 'x-t': String(Date.now())}},
+    body: JSON.stringify({{keyword: {keyword_json}, page: 1, page_size: 20, search_id: 'bench', sort: 'general',
+                          note_type: 0, ext_flags: [], image_formats: ['jpg', 'webp', 'avif']}})
+}});
+</script>
+</body></html>'''
+
+LOGGED_IN = '<li class="user side-bar-component"><span>我</span></li>'
+QRCODE = '<img class="qrcode-img" src="data:image/png;base64,iVBORw0KGgo=">'
+
+DETAIL_PAGE = '''<html><head><title>{title} - 小红书</title></head><body>
+<div id="detail-desc"><span class="note-text"><span>{desc}</span>{tags_html}</span></div>
+{images_html}
+{video_html}
+<script>window.__INITIAL_STATE__ = {state};</script>
+</body></html>'''
+
+SAFE_CHECK_PAGE = '<html><head><title>安全验证</title></head><body>请完成验证</body></html>'
+
+
+def _digest(*parts) -> str:
+    return hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+class FakeXhs:
+    """替身站点的状态：登录状态、延迟、触发安全验证的比例，以及请求计数"""
+
+    def __init__(self, fixtures_dir: str = ''):
+        self.logged_in = True
+        self.page_delay = .3  # 搜索页/详情页的响应延迟（秒）
+        self.api_delay = .1  # 接口的响应延迟（秒）
+        self.safe_check_rate = 0.0  # 详情页返回安全验证页的比例
+        self.pages_per_keyword = 3
+        self.image_bytes = 100 * 1024
+        self.counts: dict[str, int] = {}
+        self.dingtalk_messages: list[dict] = []
+        self._lock = threading.Lock()
+        self._templates = []
+        path = os.path.join(fixtures_dir, 'search_notes.json') if fixtures_dir else ''
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._templates = json.load(f).get('data', {}).get('items', [])
+
+    def count(self, name: str):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts = {}
+            self.dingtalk_messages = []
+
+    def note_id(self, keyword: str, page: int, i: int) -> str:
+        return _digest(keyword, page, i)[:24]
+
+    def item(self, keyword: str, page: int, i: int) -> dict:
+        note_id = self.note_id(keyword, page, i)
+        h = int(_digest(note_id), 16)
+        if self._templates:
+            item = json.loads(json.dumps(self._templates[i % len(self._templates)]))
+            item['id'] = note_id
+            item['xsec_token'] = 'bench' + note_id[:8]
+            return item
+        model_type = 'hot_query' if i == 5 else 'note'  # 真实结果中会夹杂非笔记条目
+        return {
+            'id': note_id,
+            'model_type': model_type,
+            'xsec_token': 'bench' + note_id[:8],
+            'note_card': {
+                'type': 'video' if h % 4 == 0 else 'normal',
+                'display_title': f'{keyword}的第{page}页第{i}篇笔记',
+                'user': {'nickname': f'用户{h % 1000}', 'user_id': _digest('u', h % 1000)[:24]},
+                'interact_info': {'liked_count': str(h % 20000), 'collected_count': str(h % 5000),
+                                  'comment_count': str(h % 800), 'shared_count': str(h % 300)},
+                'cover': {'url_default': f'/static/img/{note_id}-0.jpg'},
+                'image_list': [{'info_list': [{'url': f'/static/img/{note_id}-{k}.jpg'}]} for k in range(3)],
+                'corner_tag_info': [{'type': 'publish_time', 'text': f'{h % 28 + 1}天前'}],
+            },
+        }
+
+    def search_notes(self, body: dict) -> dict:
+        keyword = body.get('keyword', '')
+        page = int(body.get('page', 1))
+        items = [self.item(keyword, page, i) for i in range(20)] if page <= self.pages_per_keyword else []
+        return {'code': 0, 'success': True, 'msg': '成功',
+                'data': {'has_more': page < self.pages_per_keyword, 'items': items}}
+
+    def detail_state(self, note_id: str) -> dict:
+        h = int(_digest(note_id), 16)
+        is_video = h % 4 == 0
+        note = {
+            'noteId': note_id,
+            'title': f'笔记{note_id[:6]}',
+            'desc': f'这是笔记{note_id}的正文内容。' * 20,
+            'type': 'video' if is_video else 'normal',
+            'tagList': [{'name': f'话题{h % 50 + k}'} for k in range(3)],
+            'imageList': [{'urlDefault': f'/static/img/{note_id}-{k}.jpg'} for k in range(3)],
+            'interactInfo': {'likedCount': str(h % 20000), 'collectedCount': str(h % 5000),
+                             'commentCount': str(h % 800), 'shareCount': str(h % 300)},
+            'time': 1700000000000 + h % 10 ** 9,
+            'ipLocation': '上海',
+        }
+        if is_video:
+            note['video'] = {'media': {'stream': {'h264': [{'masterUrl': f'/static/video/{note_id}.mp4'}]}}}
+        return {'note': {'noteDetailMap': {note_id: {'note': note}}}}
+
+    def detail_page(self, note_id: str) -> str:
+        state = self.detail_state(note_id)
+        note = state['note']['noteDetailMap'][note_id]['note']
+        video = note.get('video')
+        return DETAIL_PAGE.format(
+            title=note['title'],
+            desc=note['desc'],
+            tags_html=''.join(f'<a id="hash-tag">#{t["name"]}</a>' for t in note['tagList']),
+            images_html=''.join(f'<img src="{i["urlDefault"]}">' for i in note['imageList']),
+            video_html=f'<video mediatype="video" src="{video["media"]["stream"]["h264"][0]["masterUrl"]}"></video>'
+            if video else '',
+            state=json.dumps(state, ensure_ascii=False),
+        )
+
+    def feed(self, body: dict) -> dict:
+        """feed接口：与详情页相同的数据，字段为下划线命名"""
+        note_id = body.get('source_note_id', '')
+        if self.is_safe_check(note_id):
+            self.count('safe_check')
+            return {'code': 300013, 'success': False, 'msg': '访问频次异常，请勿频繁操作或重启试试'}
+        note = self.detail_state(note_id)['note']['noteDetailMap'][note_id]['note']
+        card = {
+            'note_id': note_id,
+            'title': note['title'],
+            'desc': note['desc'],
+            'type': note['type'],
+            'tag_list': note['tagList'],
+            'image_list': [{'url_default': i['urlDefault']} for i in note['imageList']],
+            'interact_info': {'liked_count': note['interactInfo']['likedCount'],
+                              'collected_count': note['interactInfo']['collectedCount'],
+                              'comment_count': note['interactInfo']['commentCount'],
+                              'share_count': note['interactInfo']['shareCount']},
+            'time': note['time'],
+            'last_update_time': note['time'],
+            'ip_location': note['ipLocation'],
+        }
+        if 'video' in note:
+            card['video'] = {'media': {'stream': {'h264': [{'master_url': note['video']['media']['stream']['h264'][0]
+                                                            ['masterUrl']}]}}}
+        return {'code': 0, 'success': True, 'data': {'items': [{'id': note_id, 'model_type': 'note',
+                                                                'note_card': card}]}}
+
+    def comment_page(self, note_id: str, cursor: str) -> dict:
+        # 每个帖子共 h%30 条评论，每页10条，cursor为已返回的条数
+        total = int(_digest('c', note_id), 16) % 30
+        start = int(cursor or 0)
+        comments = [{'id': _digest(note_id, k)[:24], 'content': f'第{k + 1}条评论',
+                     'like_count': str(int(_digest(note_id, k), 16) % 500),
+                     'user_info': {'nickname': f'评论用户{k}'}} for k in range(start, min(start + 10, total))]
+        end = start + len(comments)
+        return {'code': 0, 'success': True,
+                'data': {'comments': comments, 'cursor': str(end), 'has_more': end < total}}
+
+    def is_safe_check(self, note_id: str) -> bool:
+        return self.safe_check_rate > 0 and int(_digest('sc', note_id), 16) % 1000 < self.safe_check_rate * 1000
+
+
+def make_handler(site: FakeXhs):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, data: dict, status: int = 200):
+            self._send(status, json.dumps(data, ensure_ascii=False).encode(), 'application/json')
+
+        def _html(self, text: str, headers: dict = None):
+            self._send(200, text.encode(), 'text/html; charset=utf-8', headers)
+
+        def _cookie_ok(self) -> bool:
+            return 'web_session=bench' in (self.headers.get('Cookie') or '')
+
+        def _read_json(self) -> dict:
+            n = int(self.headers.get('Content-Length') or 0)
+            try:
+                return json.loads(self.rfile.read(n) or b'{}')
+            except ValueError:
+                return {}
+
+        def do_GET(self):
+            u = urlparse(self.path)
+            qs = parse_qs(u.query)
+            if u.path == '/search_result':
+                site.count('search_page')
+                time.sleep(site.page_delay)
+                keyword = unquote(qs.get('keyword', [''])[0])
+                headers = {'Set-Cookie': 'web_session=bench; Path=/'} if site.logged_in else {}
+                self._html(SEARCH_PAGE.format(keyword=keyword, keyword_json=json.dumps(keyword),
+                                              login=LOGGED_IN if site.logged_in else QRCODE), headers)
+            elif u.path.startswith('/search_result/'):
+                site.count('detail_page')
+                time.sleep(site.page_delay)
+                note_id = u.path.rsplit('/', 1)[-1]
+                if site.is_safe_check(note_id):
+                    site.count('safe_check')
+                    self._html(SAFE_CHECK_PAGE)
+                else:
+                    self._html(site.detail_page(note_id))
+            elif u.path == '/explore':
+                site.count('explore_page')
+                time.sleep(site.page_delay)
+                self._html('<html><head><title>小红书</title></head><body></body></html>')
+            elif u.path == '/api/sns/web/v2/comment/page':
+                site.count('comment_api')
+                time.sleep(site.api_delay)
+                if not site.logged_in or not self._cookie_ok():
+                    self._json({'code': -101, 'success': False, 'msg': '无登录信息'})
+                else:
+                    self._json(site.comment_page(qs.get('note_id', [''])[0], qs.get('cursor', [''])[0]))
+            elif u.path == '/api/sns/web/v2/user/me':
+                site.count('user_me')
+                ok = site.logged_in and self._cookie_ok()
+                self._json({'success': True, 'data': {'guest': not ok}})
+            elif u.path.startswith('/static/'):
+                site.count('static')
+                self._send(200, b'\0' * site.image_bytes, 'image/jpeg')
+            else:
+                self._send(404, b'not found', 'text/plain')
+
+        def do_POST(self):
+            u = urlparse(self.path)
+            if u.path == '/api/sns/web/v1/search/notes':
+                site.count('search_api')
+                body = self._read_json()
+                time.sleep(site.api_delay)
+                if not site.logged_in or not self._cookie_ok():
+                    self._json({'code': -101, 'success': False, 'msg': '无登录信息'})
+                else:
+                    self._json(site.search_notes(body))
+            elif u.path == '/api/sns/web/v1/feed':
+                site.count('feed_api')
+                body = self._read_json()
+                time.sleep(site.api_delay)
+                if not site.logged_in or not self._cookie_ok():
+                    self._json({'code': -101, 'success': False, 'msg': '无登录信息'})
+                else:
+                    self._json(site.feed(body))
+            elif u.path == '/robot/send':
+                site.count('dingtalk')
+                site.dingtalk_messages.append(self._read_json())
+                self._json({'errcode': 0, 'errmsg': 'ok'})
+            else:
+                self._send(404, b'not found', 'text/plain')
+
+    return Handler
+
+
+def start_fake_site(port: int = 0, fixtures_dir: str = '') -> tuple[FakeXhs, ThreadingHTTPServer]:
+    """在后台线程中启动替身站点，port为0时自动分配端口"""
+    site = FakeXhs(fixtures_dir)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(site))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return site, server
+
+
+if __name__ == '__main__':
+    s, srv = start_fake_site(8765)
+    print(f'替身站点已启动：http://127.0.0.1:{srv.server_address[1]}')
+    threading.Event().wait()
@@ -0,0 +1,297 @@
+"""
+离线基准测试：启动本地替身站点，把网站、接口与钉钉webhook都指向它，然后按场景驱动
+fetch_xhs_hot_post、MultiPost 与详情流水线，输出 p50/p95/p99 延迟、吞吐与浏览器内存。
+
+    python bench/run_bench.py                      # 全部场景，直接调用工具函数
+    python bench/run_bench.py --mode sse           # 并发场景通过真实的MCP SSE客户端调用
+    python bench/run_bench.py --scenarios render,concurrent --clients 1,4,8 --json bench_output.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_site import start_fake_site  # noqa: E402
+
+ALL_SCENARIOS = ['render', 'cold', 'concurrent', 'overlap', 'cached', 'detail', 'safe_check']
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(name: str, latencies: list[float], wall: float, errors: int = 0, **extra) -> dict:
+    return {
+        'scenario': name,
+        'count': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'throughput_per_s': round(len(latencies) / wall, 2) if wall else 0,
+        **extra,
+    }
+
+
+def browser_rss_mb() -> float:
+    """所有工作单元的浏览器进程（含子进程）的RSS之和，未安装psutil时返回0"""
+    from workers import get_dispatcher
+    return round(sum(w.pool.rss_bytes() for w in get_dispatcher().workers) / 1024 / 1024, 1)
+
+
+class Bench:
+    def __init__(self, args, site):
+        self.args = args
+        self.site = site
+        self.seq = 0
+
+    def keyword(self, prefix: str) -> str:
+        # 每次调用使用不同的关键词，避免命中结果缓存与详情存储
+        self.seq += 1
+        return f'{prefix}{self.seq}'
+
+    async def timed(self, coro) -> tuple[float, bool]:
+        start = time.perf_counter()
+        try:
+            res = await coro
+            ok = isinstance(res, str) and not res.startswith('Error')
+        except Exception as e:
+            print(f'调用失败: {e}')
+            ok = False
+        return time.perf_counter() - start, ok
+
+    async def call_tool(self, search: str, limit: int) -> str:
+        import main
+        return await main.fetch_xhs_hot_post(search, limit)
+
+    async def scenario_render(self) -> list[dict]:
+        """MultiPost 构建与markdown渲染（纯CPU，不涉及浏览器）"""
+        from model import MultiPost, DetailPageInfo
+        items = [self.site.item('render', 1, i) for i in range(20)] * 3
+        details = {v['id']: DetailPageInfo(note_id=v['id'], desc='正文' * 200, tags=['a', 'b'])
+                   for v in items}
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(self.args.render_iterations):
+            t = time.perf_counter()
+            MultiPost(items, details).to_markdown()
+            latencies.append(time.perf_counter() - t)
+        return [summarize('render(60 posts)', latencies, time.perf_counter() - start)]
+
+    async def scenario_cold(self) -> list[dict]:
+        """单客户端顺序调用，每次都是新关键词"""
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for _ in range(self.args.requests):
+            lat, ok = await self.timed(self.call_tool(self.keyword('冷启动'), self.args.limit))
+            latencies.append(lat)
+            errors += not ok
+        return [summarize('cold', latencies, time.perf_counter() - start, errors, rss_mb=browser_rss_mb())]
+
+    async def scenario_concurrent(self) -> list[dict]:
+        """N个客户端并发调用，每个客户端顺序发起requests次调用"""
+        results = []
+        for n in self.args.clients:
+            latencies, errors = [], 0
+
+            async def client(call):
+                nonlocal errors
+                for _ in range(self.args.requests):
+                    lat, ok = await self.timed(call(self.keyword(f'并发{n}-'), self.args.limit))
+                    latencies.append(lat)
+                    errors += not ok
+
+            start = time.perf_counter()
+            if self.args.mode == 'sse':
+                await self.run_sse_clients(n, client)
+            else:
+                await asyncio.gather(*[client(self.call_tool) for _ in range(n)])
+            results.append(summarize(f'concurrent(clients={n},{self.args.mode})', latencies,
+                                     time.perf_counter() - start, errors, rss_mb=browser_rss_mb()))
+        return results
+
+    async def scenario_overlap(self) -> list[dict]:
+        """
+        并发调用是否真正重叠执行：N个并发调用的总耗时应接近单次调用，
+        超过单次调用的 overlap_max_ratio 倍视为被串行化，基准测试以非0状态退出
+        """
+        await self.timed(self.call_tool(self.keyword('重叠预热'), self.args.limit))  # 排除浏览器启动与登录
+        single, ok = await self.timed(self.call_tool(self.keyword('重叠'), self.args.limit))
+        n = self.args.overlap_clients
+        start = time.perf_counter()
+        res = await asyncio.gather(*[self.timed(self.call_tool(self.keyword('重叠'), self.args.limit))
+                                     for _ in range(n)])
+        wall = time.perf_counter() - start
+        ratio = wall / single if single else 0
+        passed = ok and all(v for _, v in res) and ratio <= self.args.overlap_max_ratio
+        print(f'单次调用{single:.2f}s，{n}个并发调用{wall:.2f}s，比值{ratio:.2f}（上限{self.args.overlap_max_ratio:g}）'
+              f'{"" if passed else "，未通过"}')
+        return [summarize(f'overlap(clients={n})', [lat for lat, _ in res], wall, sum(not v for _, v in res),
+                          single_ms=round(single * 1000, 1), ratio=round(ratio, 2), passed=passed)]
+
+    async def run_sse_clients(self, n: int, client):
+        """启动MCP SSE服务，并用n个独立的MCP客户端会话调用工具"""
+        from mcp import ClientSession
+        from mcp.client.sse import sse_client
+        import main
+
+        main.mcp.settings.host = '127.0.0.1'
+        main.mcp.settings.port = self.args.mcp_port
+        server = asyncio.create_task(main.mcp.run_sse_async())
+        await asyncio.sleep(1)
+        try:
+            async def one():
+                async with sse_client(f'http://127.0.0.1:{self.args.mcp_port}/sse') as streams:
+                    async with ClientSession(*streams) as session:
+                        await session.initialize()
+
+                        async def call(search, limit):
+                            res = await session.call_tool('fetch_xhs_hot_post', {'search': search, 'limit': limit})
+                            if res.isError:
+                                raise Exception(res.content)
+                            return ''.join(getattr(c, 'text', '') for c in res.content)
+
+                        await client(call)
+
+            await asyncio.gather(*[one() for _ in range(n)])
+        finally:
+            server.cancel()
+
+    async def scenario_cached(self) -> list[dict]:
+        """同一关键词重复调用，首次之后命中结果缓存"""
+        keyword = self.keyword('缓存')
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for _ in range(self.args.requests):
+            lat, ok = await self.timed(self.call_tool(keyword, self.args.limit))
+            latencies.append(lat)
+            errors += not ok
+        return [summarize('cached', latencies, time.perf_counter() - start, errors)]
+
+    async def scenario_detail(self) -> list[dict]:
+        """只测详情流水线：一批新帖子的详情获取"""
+        from logic import fetch_posts_detail
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(self.args.requests):
+            kw = self.keyword('详情')
+            items = {self.site.note_id(kw, 1, i): 'bench' for i in range(self.args.limit)}
+            t = time.perf_counter()
+            await fetch_posts_detail(items)
+            latencies.append(time.perf_counter() - t)
+        return [summarize(f'detail(batch={self.args.limit})', latencies, time.perf_counter() - start,
+                          rss_mb=browser_rss_mb())]
+
+    async def scenario_safe_check(self) -> list[dict]:
+        """部分详情页返回安全验证页时的表现"""
+        self.site.safe_check_rate = self.args.safe_check_rate
+        try:
+            res = await self.scenario_cold()
+        finally:
+            self.site.safe_check_rate = 0
+        res[0]['scenario'] = f'safe_check(rate={self.args.safe_check_rate})'
+        res[0]['safe_checks'] = self.site.counts.get('safe_check', 0)
+        res[0]['dingtalk_messages'] = len(self.site.dingtalk_messages)
+        return res
+
+    async def run(self) -> list[dict]:
+        results = []
+        for name in self.args.scenarios:
+            self.site.reset_counts()
+            print(f'>>> 场景：{name}')
+            res = await getattr(self, f'scenario_{name}')()
+            for r in res:
+                r['site_requests'] = dict(self.site.counts)
+            results.extend(res)
+        return results
+
+
+def print_table(results: list[dict]):
+    cols = ['scenario', 'count', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_per_s', 'rss_mb']
+    widths = [max(len(c), *(len(str(r.get(c, ''))) for r in results)) for c in cols]
+    print('  '.join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in results:
+        print('  '.join(str(r.get(c, '')).ljust(w) for c, w in zip(cols, widths)))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='小红书MCP服务的离线基准测试')
+    p.add_argument('--scenarios', default=','.join(ALL_SCENARIOS), help='逗号分隔，可选：' + ','.join(ALL_SCENARIOS))
+    p.add_argument('--mode', choices=['direct', 'sse'], default='direct', help='并发场景的调用方式')
+    p.add_argument('--clients', default='1,4,8', help='并发场景的客户端数量，逗号分隔')
+    p.add_argument('--requests', type=int, default=5, help='每个客户端的调用次数')
+    p.add_argument('--limit', type=int, default=5, help='每次调用获取的帖子数量')
+    p.add_argument('--render-iterations', type=int, default=200)
+    p.add_argument('--page-delay', type=float, default=.3, help='替身站点页面响应延迟（秒）')
+    p.add_argument('--api-delay', type=float, default=.1, help='替身站点接口响应延迟（秒）')
+    p.add_argument('--overlap-clients', type=int, default=4, help='overlap场景的并发调用数')
+    p.add_argument('--overlap-max-ratio', type=float, default=2, help='overlap场景并发总耗时与单次调用耗时之比的上限')
+    p.add_argument('--safe-check-rate', type=float, default=.2)
+    p.add_argument('--fixtures', default='', help='录制数据目录（可选，含search_notes.json）')
+    p.add_argument('--mcp-port', type=int, default=19090)
+    p.add_argument('--json', default='', help='结果另存为json文件')
+    args = p.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(',') if s]
+    args.clients = [int(c) for c in args.clients.split(',') if c]
+    return args
+
+
+def free_port() -> int:
+    """浏览器调试端口；第N个工作单元使用该端口+N"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def amain(args):
+    site, server = start_fake_site(fixtures_dir=args.fixtures)
+    site.page_delay = args.page_delay
+    site.api_delay = args.api_delay
+    origin = f'http://127.0.0.1:{server.server_address[1]}'
+
+    # 在导入服务代码前设置环境变量（load_env 不会覆盖已有的值）
+    tmp = tempfile.mkdtemp(prefix='xhs-bench-')
+    port = free_port()
+    os.environ.update({
+        'XHS_WEB_ORIGIN': origin,
+        'XHS_API_ORIGIN': origin,
+        'DINGTALK_WEBHOOK_URI': f'{origin}/robot/send?access_token=bench',
+        'DINGTALK_SECRET': 'bench',
+        'XHS_DETAIL_DB': os.path.join(tmp, 'bench.db'),
+        'XHS_CACHE_PATH': '',
+        'XHS_PAGE_RATE': os.getenv('XHS_PAGE_RATE', '0'),
+        # 压测不能使用真实的用户目录与端口，否则会复用已登录的账号或连上正在运行的浏览器
+        'XHS_WORKER0_PROFILE': os.path.join(tmp, 'profiles', 'worker0'),
+        'XHS_WORKER0_PORT': str(port),
+        'XHS_BASE_PORT': str(port),
+        'XHS_PROFILE_DIR': os.path.join(tmp, 'profiles'),
+    })
+    import main  # 触发load_env与服务初始化
+    main.install_executor()
+
+    try:
+        results = await Bench(args, site).run()
+    finally:
+        server.shutdown()
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if any(r.get('passed') is False for r in results):
+        sys.exit('并发调用没有重叠执行')
+    return results
+
+
+if __name__ == '__main__':
+    asyncio.run(amain(parse_args()))
@@ -0,0 +1,82 @@
+import os
+import threading
+
+from DrissionPage.items import MixTab
+
+# 只需要读取文本、标签和视频地址，图片、音视频、字体都不需要下载
+DEFAULT_BLOCK_TYPES = 'Image,Media,Font'
+# 埋点与性能监控上报
+DEFAULT_BLOCK_URLS = '*apm-fe.xiaohongshu.com*,*t2.xiaohongshu.com*'
+
+
+class ResourceBlocker:
+    """
+    基于CDP Fetch域的请求拦截：按资源类型或URL通配符拦截不需要的请求，并统计拦截数量与字节数（按标签页记录，标签页关闭后并入累计值）。
+    按资源类型拦截在响应头阶段进行（此时响应体尚未下载），可以从Content-Length得到节省的字节数；
+    按URL拦截在请求阶段进行，只统计请求数。
+    """
+
+    def __init__(self, types: list[str], url_patterns: list[str]):
+        self.types = [t for t in types if t]
+        self.url_patterns = [p for p in url_patterns if p]
+        self._stats: dict[str, dict] = {}  # tab_id -> 统计
+        self._closed = {'requests': 0, 'bytes': 0}  # 已关闭标签页的累计
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.types or self.url_patterns)
+
+    def attach(self, tab: MixTab):
+        """为标签页开启拦截，需在导航前调用"""
+        if not self.enabled:
+            return
+        stats = {'requests': 0, 'bytes': 0}
+        with self._lock:
+            self._stats[tab.tab_id] = stats
+
+        def on_paused(**kwargs):
+            size = 0
+            for h in kwargs.get('responseHeaders') or []:
+                if h.get('name', '').lower() == 'content-length' and h.get('value', '').isdigit():
+                    size = int(h['value'])
+            try:
+                tab.driver.run('Fetch.failRequest', requestId=kwargs['requestId'], errorReason='BlockedByClient')
+            except Exception as e:
+                print(f'拦截请求异常: {e}')
+                return
+            with self._lock:
+                stats['requests'] += 1
+                stats['bytes'] += size
+
+        patterns = [{'urlPattern': p, 'requestStage': 'Request'} for p in self.url_patterns]
+        patterns += [{'urlPattern': '*', 'resourceType': t, 'requestStage': 'Response'} for t in self.types]
+        tab.driver.set_callback('Fetch.requestPaused', on_paused, immediate=True)
+        tab.run_cdp('Fetch.enable', patterns=patterns)
+
+    def detach(self, tab_id: str):
+        """标签页关闭时调用，其统计并入累计值"""
+        with self._lock:
+            stats = self._stats.pop(tab_id, None)
+            if stats:
+                self._closed['requests'] += stats['requests']
+                self._closed['bytes'] += stats['bytes']
+
+    def stats(self) -> dict:
+        """所有标签页的累计拦截数据"""
+        with self._lock:
+            return {
+                'requests': self._closed['requests'] + sum(v['requests'] for v in self._stats.values()),
+                'bytes': self._closed['bytes'] + sum(v['bytes'] for v in self._stats.values()),
+            }
+
+
+_blocker: ResourceBlocker | None = None
+
+
+def get_blocker() -> ResourceBlocker:
+    global _blocker
+    if _blocker is None:
+        _blocker = ResourceBlocker(types=os.getenv('XHS_BLOCK_TYPES', DEFAULT_BLOCK_TYPES).split(','),
+                                   url_patterns=os.getenv('XHS_BLOCK_URLS', DEFAULT_BLOCK_URLS).split(','))
+    return _blocker
@@ -0,0 +1,126 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import cache_requests
+from model import MultiPost
+
+
+class ResultCache:
+    """
+    搜索结果缓存：TTL过期 + 按条目数与字节数的LRU淘汰，可选持久化到磁盘。
+    缓存的是解析后的 MultiPost，而不是渲染好的字符串，方便同一条目输出不同格式。
+    持久化在后台线程中合并进行：写入后最多延迟flush_interval秒保存一次，不阻塞调用方（事件循环）。
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 256, max_bytes: int = 32 << 20, path: str = '',
+                 flush_interval: float = 5):
+        """
+        :param ttl: 过期时间（秒），<=0 表示关闭缓存
+        :param max_entries: 最大条目数
+        :param max_bytes: 最大总字节数（按pickle后的大小估算）
+        :param path: 持久化文件路径，为空则仅在内存中缓存
+        :param flush_interval: 写入后延迟保存的时间（秒），期间的多次写入合并为一次保存
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.flush_interval = flush_interval
+        self._data: OrderedDict[tuple, tuple[float, int, MultiPost]] = OrderedDict()  # key -> (写入时间, 字节数, 值)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # 同一时间只有一个线程写文件
+        self._timer: threading.Timer | None = None
+        if path:
+            self._load()
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._data),
+            'bytes': self._bytes,
+        }
+
+    def get(self, key: tuple) -> MultiPost | None:
+        """命中与未命中次数记录在 cache_requests 指标中（cache=result）"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                self._pop(key)
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+        cache_requests.inc(cache='result', result='miss' if entry is None else 'hit')
+        return None if entry is None else entry[2]
+
+    def put(self, key: tuple, value: MultiPost):
+        if self.ttl <= 0:
+            return
+        size = len(pickle.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (time.time(), size, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+            self._schedule_flush()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """在锁内调用：还没有待执行的保存时，延迟flush_interval秒在后台线程中保存"""
+        if not self.path or self._timer is not None:
+            return
+        self._timer = threading.Timer(self.flush_interval, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """立即保存到磁盘（阻塞，服务退出时调用）；只在锁内复制条目列表，序列化与写文件在锁外进行"""
+        if not self.path:
+            return
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            items = list(self._data.items())
+        with self._save_lock:
+            self._save(items)
+
+    def _pop(self, key: tuple):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _save(self, items: list):
+        # 先写临时文件再替换，保存中途退出不会损坏已有的缓存文件
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(items, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f'缓存持久化失败: {e}')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                items = pickle.load(f)
+        except Exception as e:
+            print(f'缓存文件读取失败: {e}')
+            return
+        now = time.time()
+        for key, (stored_at, size, value) in items:
+            if now - stored_at <= self.ttl:
+                self._data[key] = (stored_at, size, value)
+                self._bytes += size
@@ -0,0 +1,83 @@
+import json
+from asyncio import to_thread
+
+from DrissionPage.items import MixTab
+
+from feed import RATE_LIMIT_CODES
+from model import Comment
+from util import api_origin
+
+COMMENT_PAGE_PATH = '/api/sns/web/v2/comment/page'
+
+# 在已登录的页面中请求评论接口：使用页面自身的签名函数生成x-s/x-t，cookie随请求自动携带。
+# 返回接口响应的原文，由python解析
+COMMENT_PAGE_JS = '''
+const [origin, path] = [arguments[0], arguments[1]];
+const headers = {};
+if (typeof window._webmsxyw === 'function') {
+    const sign = window._webmsxyw(path, undefined);
+    headers['x-s'] = sign['X-s'];
+    headers['x-t'] = String(sign['X-t']);
+}
+return fetch(origin + path, {credentials: 'include', headers: headers}).then(r => r.text());
+'''
+
+
+class RateLimited(Exception):
+    """评论接口因访问频率拒绝请求（错误码见 RATE_LIMIT_CODES），调用方应按触发安全验证处理"""
+
+
+def comment_page_path(note_id: str, xsec_token: str, cursor: str = '') -> str:
+    return (f'{COMMENT_PAGE_PATH}?note_id={note_id}&cursor={cursor}&top_comment_id='
+            f'&image_formats=jpg,webp,avif&xsec_token={xsec_token}')
+
+
+def parse_comment(raw: dict) -> Comment:
+    return Comment(user_name=(raw.get('user_info') or {}).get('nickname'),
+                   content=raw.get('content'),
+                   liked_count=raw.get('like_count'))
+
+
+async def fetch_comment_page(tab: MixTab, note_id: str, xsec_token: str, cursor: str = '') -> dict | None:
+    """
+    请求一页评论
+    :return: 接口返回的data（含comments、cursor、has_more），失败返回None
+    :raise RateLimited: 因访问频率被拒绝
+    """
+    try:
+        raw = await to_thread(tab.run_js, COMMENT_PAGE_JS, api_origin(),
+                              comment_page_path(note_id, xsec_token, cursor), timeout=10)
+        body = json.loads(raw) if raw else {}
+    except Exception as e:
+        print(f'请求评论异常：{note_id} {e}')
+        return None
+    if not isinstance(body, dict) or not body.get('success'):
+        print(f'请求评论被拒绝：{note_id} {body}')
+        if isinstance(body, dict) and body.get('code') in RATE_LIMIT_CODES:
+            raise RateLimited(body.get('msg') or body.get('code'))
+        return None
+    return body.get('data') or {}
+
+
+async def fetch_comments_from_tab(tab: MixTab, note_id: str, xsec_token: str,
+                                  limit: int) -> tuple[list[Comment], bool] | None:
+    """
+    按cursor逐页获取评论，直到凑够limit条或没有更多
+    :return: (评论列表, 是否还有更多)，第一页就失败时返回None
+    :raise RateLimited: 因访问频率被拒绝
+    """
+    comments: list[Comment] = []
+    cursor = ''
+    has_more = True
+    while has_more and len(comments) < limit:
+        data = await fetch_comment_page(tab, note_id, xsec_token, cursor)
+        if data is None:
+            if not comments:
+                return None
+            break
+        comments += [parse_comment(c) for c in data.get('comments') or []]
+        has_more = bool(data.get('has_more'))
+        cursor = data.get('cursor') or ''
+        if not cursor:
+            break
+    return comments[:limit], has_more or len(comments) > limit
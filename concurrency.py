@@ -0,0 +1,316 @@
+import asyncio
+import collections
+import time
+import typing
+from contextlib import asynccontextmanager
+
+T = typing.TypeVar('T')
+
+
+class SingleFlight:
+    """
+    合并相同key的并发调用：同一时刻只执行一次，其余调用方等待同一个结果。
+    共享的任务不会因为某个调用方被取消而中断。
+    """
+
+    def __init__(self):
+        self._calls: dict[typing.Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: typing.Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: typing.Hashable, fn: typing.Callable[[], typing.Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+
+class TokenBucket:
+    """令牌桶限速：平均每秒rate个令牌，最多积攒burst个"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD方式自适应调整并发数：请求快且正常时缓慢加并发（每轮约+1），
+    耗时超过目标或触发安全验证时大幅降并发；触发安全验证后进入冷却期。
+    """
+
+    def __init__(self, initial: int = 3, min_limit: int = 1, max_limit: int = 6, target_latency: float = 5,
+                 cooldown: float = 300):
+        """
+        :param initial: 初始并发数
+        :param min_limit: 最小并发数
+        :param max_limit: 最大并发数
+        :param target_latency: 单个请求的目标耗时（秒），超过则减半并发
+        :param cooldown: 触发安全验证后的冷却时间（秒）
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.paused_until = 0.0
+        self._inflight = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    @property
+    def paused(self) -> bool:
+        """是否处于安全验证后的冷却期"""
+        return time.monotonic() < self.paused_until
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._inflight < int(self.limit))
+            self._inflight += 1
+
+    async def release(self, latency: float | None = None):
+        """
+        :param latency: 本次请求耗时，None表示失败或不计入（不调整并发）
+        """
+        async with self._cond:
+            self._inflight -= 1
+            if latency is not None:
+                if latency > self.target_latency:
+                    self._decrease()
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _decrease(self):
+        # 同一批并发的慢请求只减一次，避免瞬间降到底
+        now = time.monotonic()
+        if now - self._last_decrease < self.target_latency:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit / 2)
+
+    def on_safe_check(self):
+        self.limit = self.min_limit
+        self.paused_until = time.monotonic() + self.cooldown
+        print(f'并发降至{self.min_limit}，冷却{self.cooldown}s')
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个并发名额，块内通过 yield 的 dict 设置 latency"""
+        await self.acquire()
+        result = {'latency': None}
+        try:
+            yield result
+        finally:
+            await self.release(result['latency'])
+
+
+class CircuitBreaker:
+    """
+    熔断器：window秒内失败（触发安全验证）达到threshold次后断开，期间拒绝所有请求；
+    reset_timeout秒后半开，放行一个试探请求，试探成功则闭合，失败则重新断开。
+    """
+
+    def __init__(self, threshold: int = 3, window: float = 300, reset_timeout: float = 600,
+                 probe_timeout: float = 60):
+        """
+        :param threshold: 断开所需的失败次数
+        :param window: 统计失败次数的时间窗口（秒）
+        :param reset_timeout: 断开后多久进入半开状态（秒）
+        :param probe_timeout: 试探请求迟迟没有结果时，多久后允许再放行一个（秒）
+        """
+        self.threshold = threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.opened_at = 0.0  # 0表示闭合
+        self._failures: collections.deque[float] = collections.deque()
+        self._probe_at = 0.0
+
+    @property
+    def state(self) -> str:
+        """closed、open 或 half_open"""
+        if not self.opened_at:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def allow(self, probe: bool = True) -> bool:
+        """
+        是否放行本次请求；半开状态下同一时间只放行一个试探请求
+        :param probe: 为False时不占用试探名额，半开时直接放行（用于搜索：搜索成功不能证明详情页已恢复，
+            若由搜索占用试探名额，同一调用的详情都会被拒绝，熔断器也永远不会闭合）
+        """
+        state = self.state
+        if state == 'closed' or (state == 'half_open' and not probe):
+            return True
+        if state == 'half_open' and time.monotonic() - self._probe_at >= self.probe_timeout:
+            self._probe_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at:
+            print('熔断器闭合')
+        self.opened_at = 0.0
+        self._probe_at = 0.0
+        self._failures.clear()
+
+    def record_failure(self):
+        now = time.monotonic()
+        if self.opened_at:
+            # 试探失败，重新断开
+            self.opened_at = now
+            self._probe_at = 0.0
+            return
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.window:
+            self._failures.popleft()
+        if len(self._failures) >= self.threshold:
+            self.opened_at = now
+            print(f'{self.window}s内失败{len(self._failures)}次，熔断{self.reset_timeout}s')
+
+
+class Overloaded(Exception):
+    """准入控制拒绝了本次调用"""
+
+    def __init__(self, reason: str, message: str):
+        """
+        :param reason: queue_full 或 timeout
+        """
+        super().__init__(message)
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    准入控制：同时执行的调用不超过max_inflight个，其余排队等待；
+    排队已满时直接拒绝，排队超过timeout秒也拒绝，避免请求无限堆积。
+    """
+
+    def __init__(self, max_inflight: int = 4, max_queue: int = 16, timeout: float = 60):
+        """
+        :param max_inflight: 同时执行的调用数上限
+        :param max_queue: 排队的调用数上限
+        :param timeout: 排队等待的最长时间（秒）
+        """
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._inflight = 0
+        self._waiting = 0
+        self._cond = asyncio.Condition()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    async def _acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._inflight < self.max_inflight)
+            self._inflight += 1
+
+    async def _release(self):
+        async with self._cond:
+            self._inflight -= 1
+            self._cond.notify()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        占用一个执行名额，块内通过 yield 的 dict 读取排队耗时 wait
+        :raise Overloaded: 排队已满或排队超时
+        """
+        if self._inflight >= self.max_inflight and self._waiting >= self.max_queue:
+            raise Overloaded('queue_full', f'服务繁忙：{self._inflight}个调用执行中，{self._waiting}个排队中，请稍后再试')
+        start = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._acquire(), self.timeout)
+        except TimeoutError:
+            raise Overloaded('timeout', f'服务繁忙：排队超过{self.timeout:g}s，请稍后再试') from None
+        finally:
+            self._waiting -= 1
+        try:
+            yield {'wait': time.monotonic() - start}
+        finally:
+            await self._release()
+
+
+class Batcher(typing.Generic[T]):
+    """
+    把短时间内的单个请求合并为一批执行：第一个请求到达后等待window秒或凑够max_size个，再一次性调用fn。
+    fn 接收参数列表，返回等长的结果列表；fn 抛出异常时这一批的调用方都收到该异常。
+    """
+
+    def __init__(self, fn: typing.Callable[[list], typing.Awaitable[list[T]]], max_size: int = 10,
+                 window: float = .05):
+        """
+        :param max_size: 每批的最大请求数
+        :param window: 凑批的等待时间（秒）
+        """
+        self.fn = fn
+        self.max_size = max_size
+        self.window = window
+        self._pending: list[tuple[typing.Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._running: set[asyncio.Task] = set()
+
+    async def submit(self, arg) -> T:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((arg, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list[tuple[typing.Any, asyncio.Future]]):
+        try:
+            results = await self.fn([arg for arg, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), res in zip(batch, results):
+            if not future.done():
+                future.set_result(res)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+from asyncio import to_thread
+
+from DrissionPage.items import MixTab
+from lxml import html
+
+from model import DetailPageInfo
+
+# 一次JS调用从页面状态（window.__INITIAL_STATE__）中读取帖子的结构化数据，未就绪时返回null
+NOTE_STATE_JS = '''
+const id = arguments[0];
+const s = window.__INITIAL_STATE__;
+if (!s || !s.note) return null;
+let m = s.note.noteDetailMap;
+m = (m && (m._value || m.value)) || m;
+const n = m && m[id] && m[id].note;
+if (!n || !n.noteId) return null;
+const stream = (n.video && n.video.media && n.video.media.stream) || {};
+const videos = [].concat(stream.h264 || [], stream.h265 || [], stream.av1 || []);
+const interact = n.interactInfo || {};
+return JSON.stringify({
+    desc: n.desc || '',
+    tags: (n.tagList || []).map(t => t.name).filter(Boolean),
+    video_url: videos.length ? (videos[0].masterUrl || '') : '',
+    images: (n.imageList || []).map(i => i.urlDefault || i.url || '').filter(Boolean),
+    liked_count: interact.likedCount,
+    collected_count: interact.collectedCount,
+    comment_count: interact.commentCount,
+    shared_count: interact.shareCount,
+    ip_location: n.ipLocation || '',
+    publish_ts: n.time,
+    update_ts: n.lastUpdateTime,
+});
+'''
+
+
+async def extract_from_state(tab: MixTab, note_id: str, url: str, timeout: float = 5,
+                             interval: float = .2) -> DetailPageInfo | None:
+    """
+    轮询页面状态直到帖子数据就绪，超时返回None
+    :param timeout: 最长等待时间（秒）
+    :param interval: 轮询间隔（秒）
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            raw = await to_thread(tab.run_js, NOTE_STATE_JS, note_id)
+        except Exception as e:
+            print(f'读取页面状态异常: {e}')
+            raw = None
+        if raw:
+            return DetailPageInfo(note_id=note_id, url=url, **json.loads(raw))
+        if time.monotonic() >= deadline:
+            return None
+        await asyncio.sleep(interval)
+
+
+async def extract_from_dom(tab: MixTab, note_id: str, url: str) -> DetailPageInfo:
+    """原有的DOM解析方式，页面状态不可用时作为兜底"""
+    desc = await to_thread(tab, 'xpath://div[@id="detail-desc"]/span[@class="note-text"]/span[1]', timeout=5)
+    desc = desc.text if desc else ''
+
+    tree = await to_thread(lambda: html.fromstring(tab.html))
+    player = tree.xpath('//video[@mediatype="video"]')
+
+    video_url = ''
+    if player:
+        video_url = player[0].get('src', '').removeprefix('blob:')
+    tags = tree.xpath('//div[@id="detail-desc"]/span[@class="note-text"]/a[@id="hash-tag"]')
+    if tags:
+        tags = [tag.text for tag in tags]
+
+    return DetailPageInfo(
+        note_id=note_id,
+        url=url,
+        video_url=video_url,
+        desc=desc,
+        tags=tags
+    )
@@ -0,0 +1,89 @@
+import json
+from asyncio import to_thread
+
+from DrissionPage.items import MixTab
+
+from model import DetailPageInfo
+from util import api_origin
+
+FEED_PATH = '/api/sns/web/v1/feed'
+
+# 按访问频率拒绝请求的错误码（300012 IP存在风险、300013 访问频次异常、300015 浏览器环境异常），与详情页的安全验证同等对待
+RATE_LIMIT_CODES = {300012, 300013, 300015}
+ERR_RATE_LIMITED = 'feed接口访问频次异常'
+
+# 在已登录的页面中一次性请求多个帖子的feed接口：每个请求用页面自身的签名函数生成x-s/x-t，cookie随请求自动携带。
+# 参数notes为 [[note_id, xsec_token], ...] 的json，返回各接口响应原文组成的json数组，由python解析
+FEED_JS = '''
+const [origin, path, notes] = [arguments[0], arguments[1], JSON.parse(arguments[2])];
+return Promise.all(notes.map(([id, token]) => {
+    const body = {source_note_id: id, image_formats: ['jpg', 'webp', 'avif'], extra: {need_body_topic: '1'},
+                  xsec_source: 'pc_search', xsec_token: token};
+    const headers = {'content-type': 'application/json;charset=UTF-8'};
+    if (typeof window._webmsxyw === 'function') {
+        const sign = window._webmsxyw(path, body);
+        headers['x-s'] = sign['X-s'];
+        headers['x-t'] = String(sign['X-t']);
+    }
+    return fetch(origin + path, {method: 'POST', credentials: 'include', headers: headers, body: JSON.stringify(body)})
+        .then(r => r.text()).catch(() => '');
+})).then(texts => JSON.stringify(texts));
+'''
+
+
+def parse_feed_note(note_id: str, url: str, card: dict) -> DetailPageInfo:
+    """feed接口返回的note_card转为详情，比详情页多出完整的图片列表、IP属地与精确的发布/更新时间"""
+    stream = ((card.get('video') or {}).get('media') or {}).get('stream') or {}
+    videos = [*(stream.get('h264') or []), *(stream.get('h265') or []), *(stream.get('av1') or [])]
+    interact = card.get('interact_info') or {}
+    return DetailPageInfo(
+        note_id=note_id,
+        url=url,
+        desc=card.get('desc') or '',
+        tags=[t['name'] for t in card.get('tag_list') or [] if t.get('name')],
+        video_url=videos[0].get('master_url') or '' if videos else '',
+        images=[u for u in (i.get('url_default') or i.get('url') for i in card.get('image_list') or []) if u],
+        liked_count=interact.get('liked_count'),
+        collected_count=interact.get('collected_count'),
+        comment_count=interact.get('comment_count'),
+        shared_count=interact.get('share_count'),
+        ip_location=card.get('ip_location') or '',
+        publish_ts=card.get('time'),
+        update_ts=card.get('last_update_time'),
+    )
+
+
+def parse_feed_response(note_id: str, url: str, raw: str) -> DetailPageInfo | None:
+    """:return: 接口拒绝或没有该帖子时返回None；因访问频率被拒绝时返回error为ERR_RATE_LIMITED的详情"""
+    try:
+        body = json.loads(raw) if raw else {}
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict) or not body.get('success'):
+        print(f'请求feed被拒绝：{note_id} {body}')
+        if isinstance(body, dict) and body.get('code') in RATE_LIMIT_CODES:
+            return DetailPageInfo(note_id=note_id, url=url, error=ERR_RATE_LIMITED)
+        return None
+    for item in (body.get('data') or {}).get('items') or []:
+        if item.get('id') == note_id and item.get('note_card'):
+            return parse_feed_note(note_id, url, item['note_card'])
+    print(f'feed中没有该帖子：{note_id}')
+    return None
+
+
+async def fetch_feed_from_tab(tab: MixTab, notes: list[tuple[str, str, str]]) -> list[DetailPageInfo | None]:
+    """
+    在一次JS调用中并发请求多个帖子的feed接口
+    :param notes: [(note_id, xsec_token, 详情页url), ...]
+    :return: 与notes等长，获取失败的位置为None，见 parse_feed_response
+    """
+    try:
+        raw = await to_thread(tab.run_js, FEED_JS, api_origin(), FEED_PATH,
+                              json.dumps([[n, t] for n, t, _ in notes]), timeout=15)
+        texts = json.loads(raw) if raw else []
+    except Exception as e:
+        print(f'请求feed异常：{e}')
+        return [None] * len(notes)
+    if len(texts) != len(notes):
+        return [None] * len(notes)
+    return [parse_feed_response(n, url, text) for (n, _, url), text in zip(notes, texts)]
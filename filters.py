@@ -0,0 +1,138 @@
+import re
+from datetime import date, timedelta
+
+# note_type 参数与搜索结果中 note_card.type 的对应关系
+CARD_TYPES = {1: 'video', 2: 'normal'}
+
+
+def parse_count(value) -> int:
+    """互动数转为整数，如 '1.2万'、'1.2w' -> 12000、'10+' -> 10，无法解析时为0"""
+    s = str(value or '').strip().rstrip('+')
+    unit = 1
+    if s.endswith(('万', 'w', 'W')):
+        s, unit = s[:-1], 10000
+    elif s.endswith('亿'):
+        s, unit = s[:-1], 100000000
+    try:
+        return int(float(s) * unit)
+    except ValueError:
+        return 0
+
+
+def parse_publish_date(text: str, today: date | None = None) -> date | None:
+    """
+    解析搜索结果中的发布时间，如 '刚刚'、'3小时前'、'2天前'、'昨天 12:30'、'06-15'、'2023-06-15'
+    :return: 发布日期，无法解析时返回None
+    """
+    today = today or date.today()
+    text = (text or '').replace('编辑于', '').strip()
+    if text.startswith('刚刚') or re.match(r'\d+\s*(秒|分钟|小时)前', text):
+        return today
+    if m := re.match(r'(\d+)\s*天前', text):
+        return today - timedelta(days=int(m[1]))
+    if text.startswith('昨天'):
+        return today - timedelta(days=1)
+    if text.startswith('前天'):
+        return today - timedelta(days=2)
+    try:
+        if m := re.match(r'(\d{4})-(\d{1,2})-(\d{1,2})', text):
+            return date(int(m[1]), int(m[2]), int(m[3]))
+        if m := re.match(r'(\d{1,2})-(\d{1,2})', text):
+            # 今年的帖子不显示年份，晚于今天的日期只能是去年的
+            d = date(today.year, int(m[1]), int(m[2]))
+            return d if d <= today else d.replace(year=today.year - 1)
+    except ValueError:
+        return None
+    return None
+
+
+def card_publish_date(item: dict) -> date | None:
+    for tag in item.get('note_card', {}).get('corner_tag_info') or []:
+        if tag.get('type') == 'publish_time':
+            return parse_publish_date(tag.get('text'))
+    return None
+
+
+class PostFilter:
+    """
+    在获取详情之前，按搜索结果（note_card）中的互动数、发布时间与帖子类型过滤，
+    只为最终会返回的帖子打开详情页。无法解析发布时间的帖子在限定了时间范围时会被过滤掉。
+    """
+
+    def __init__(self, note_type: int = 0, min_liked: int = 0, min_collected: int = 0, min_comments: int = 0,
+                 published_after: date | None = None, published_before: date | None = None):
+        """
+        :param note_type: 0-全部 1-视频 2-图文，与搜索参数相同，这里再按结果中的类型核对一次
+        :param min_liked: 最少点赞数
+        :param min_collected: 最少收藏数
+        :param min_comments: 最少评论数
+        :param published_after: 发布日期不早于该日期
+        :param published_before: 发布日期不晚于该日期
+        """
+        self.card_type = CARD_TYPES.get(note_type)
+        self.min_liked = min_liked
+        self.min_collected = min_collected
+        self.min_comments = min_comments
+        self.published_after = published_after
+        self.published_before = published_before
+
+    @classmethod
+    def parse(cls, note_type: int = 0, min_liked: int = 0, min_collected: int = 0, min_comments: int = 0,
+              max_age_days: int = 0, published_after: str = '', published_before: str = '') -> 'PostFilter':
+        """
+        由工具参数创建
+        :param max_age_days: 只要最近N天发布的帖子，0表示不限制
+        :param published_after: YYYY-MM-DD，为空表示不限制
+        :param published_before: YYYY-MM-DD，为空表示不限制
+        :raise ValueError: 参数错误，异常信息可直接返回给客户端
+        """
+        if min(min_liked, min_collected, min_comments, max_age_days) < 0:
+            raise ValueError('过滤条件不能为负数')
+        try:
+            after = date.fromisoformat(published_after) if published_after else None
+            before = date.fromisoformat(published_before) if published_before else None
+        except ValueError:
+            raise ValueError('发布日期的格式应为YYYY-MM-DD') from None
+        if max_age_days:
+            since = date.today() - timedelta(days=max_age_days)
+            after = max(after, since) if after else since
+        if after and before and after > before:
+            raise ValueError('发布日期的范围为空')
+        return cls(note_type, min_liked, min_collected, min_comments, after, before)
+
+    @property
+    def active(self) -> bool:
+        """是否有搜索参数以外的过滤条件（需要多翻页凑够数量）"""
+        return bool(self.min_liked or self.min_collected or self.min_comments
+                    or self.published_after or self.published_before)
+
+    def key(self) -> tuple:
+        """用于缓存键"""
+        return (self.card_type, self.min_liked, self.min_collected, self.min_comments,
+                self.published_after, self.published_before)
+
+    def match(self, item: dict) -> bool:
+        card = item.get('note_card', {})
+        if self.card_type and card.get('type') != self.card_type:
+            return False
+        interact = card.get('interact_info', {})
+        if (parse_count(interact.get('liked_count')) < self.min_liked
+                or parse_count(interact.get('collected_count')) < self.min_collected
+                or parse_count(interact.get('comment_count')) < self.min_comments):
+            return False
+        if self.published_after or self.published_before:
+            published = card_publish_date(item)
+            if published is None:
+                return False
+            if self.published_after and published < self.published_after:
+                return False
+            if self.published_before and published > self.published_before:
+                return False
+        return True
+
+    def too_old(self, item: dict) -> bool:
+        """早于时间范围的帖子；按时间倒序搜索时，一整页都过旧即可停止翻页"""
+        if not self.published_after:
+            return False
+        published = card_publish_date(item)
+        return published is not None and published < self.published_after
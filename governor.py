@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from concurrency import AdmissionController, Overloaded
+from metrics import registry
+from workers import BrowserWorker, get_dispatcher
+
+admission_wait = registry.histogram('xhs_admission_wait_seconds', '工具调用在准入控制中的排队时间')
+admission_rejected = registry.counter('xhs_admission_rejected_total', '被准入控制拒绝的工具调用，reason为queue_full或timeout')
+browser_restarts = registry.counter('xhs_browser_restarts_total', '浏览器重启次数，reason为navigations或memory')
+
+
+class MemoryGovernor:
+    """
+    浏览器内存治理：定时检查各工作单元的浏览器，页面导航次数达到上限或内存超过上限时重启浏览器，
+    避免长时间运行后Chromium内存持续增长。内存需安装psutil才能统计，否则只按导航次数重启。
+    """
+
+    def __init__(self, max_navigations: int = 500, max_rss_mb: float = 0, interval: float = 30):
+        """
+        :param max_navigations: 浏览器启动以来的导航次数上限，<=0表示不限制
+        :param max_rss_mb: 浏览器（含子进程）的内存上限（MB），<=0表示不限制
+        :param interval: 检查间隔（秒）
+        """
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for worker in get_dispatcher().workers:
+                try:
+                    await self.check(worker)
+                except Exception as e:
+                    print(f'{worker.name}检查浏览器内存异常：{e}')
+
+    def restart_reason(self, worker: BrowserWorker, rss_mb: float) -> str:
+        """:return: 需要重启的原因，为空表示不需要"""
+        if self.max_navigations > 0 and worker.pool.stats()['navigations'] >= self.max_navigations:
+            return 'navigations'
+        if self.max_rss_mb > 0 and rss_mb >= self.max_rss_mb:
+            return 'memory'
+        return ''
+
+    async def check(self, worker: BrowserWorker):
+        if not worker.pool.started:  # 未启动的浏览器不检查
+            return
+        rss_mb = await asyncio.to_thread(worker.pool.rss_bytes) / 1024 / 1024
+        reason = self.restart_reason(worker, rss_mb)
+        if not reason:
+            return
+        stats = worker.pool.stats()
+        print(f'{worker.name}重启浏览器（{reason}）：导航{stats["navigations"]}次，内存{rss_mb:.0f}MB，'
+              f'标签页{stats["total"]}个')
+        start = time.monotonic()
+        await worker.pool.restart()
+        browser_restarts.inc(worker=worker.name, reason=reason)
+        print(f'{worker.name}浏览器重启完成，耗时{time.monotonic() - start:.1f}s')
+
+
+_admission: AdmissionController | None = None
+_governor: MemoryGovernor | None = None
+
+
+def get_admission() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController(max_inflight=int(os.getenv('XHS_MAX_INFLIGHT', 4)),
+                                         max_queue=int(os.getenv('XHS_MAX_QUEUE', 16)),
+                                         timeout=float(os.getenv('XHS_QUEUE_TIMEOUT', 60)))
+    return _admission
+
+
+def get_governor() -> MemoryGovernor:
+    global _governor
+    if _governor is None:
+        _governor = MemoryGovernor(max_navigations=int(os.getenv('XHS_BROWSER_MAX_NAVIGATIONS', 500)),
+                                   max_rss_mb=float(os.getenv('XHS_BROWSER_MAX_RSS_MB', 0)),
+                                   interval=float(os.getenv('XHS_GOVERNOR_INTERVAL', 30)))
+    return _governor
+
+
+@asynccontextmanager
+async def admitted(tool: str):
+    """
+    工具调用的准入控制，记录排队时间与拒绝次数
+    :raise Overloaded: 排队已满或排队超时
+    """
+    start = time.monotonic()
+    try:
+        async with get_admission().slot() as slot:
+            admission_wait.observe(slot['wait'], tool=tool)
+            yield
+    except Overloaded as e:
+        admission_wait.observe(time.monotonic() - start, tool=tool)
+        admission_rejected.inc(tool=tool, reason=e.reason)
+        print(f'拒绝调用{tool}：{e}')
+        raise
+
+
+registry.gauge('xhs_admission_inflight', '正在执行的工具调用数量', lambda: [] if _admission is None else [
+    ({}, _admission.inflight)])
+registry.gauge('xhs_admission_waiting', '排队等待执行的工具调用数量', lambda: [] if _admission is None else [
+    ({}, _admission.waiting)])
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import time
+from asyncio import to_thread
+
+from logic import login_once, is_user_loggined, ensure_site_page, search_core
+from metrics import registry, span
+from notifier import get_notifier
+from util import readable_time, web_origin
+from workers import BrowserWorker, get_dispatcher
+
+# 工作单元的就绪状态
+STATE_STARTING = 'starting'
+STATE_LAUNCHING = 'launching'
+STATE_WAITING_LOGIN = 'waiting_login'
+STATE_READY = 'ready'
+STATE_ERROR = 'error'
+
+
+class SessionKeeper:
+    """
+    后台会话守护：服务启动时即启动各工作单元的浏览器并预热标签页，定时探测登录状态，
+    未登录时提前走扫码流程，登录cookie临近过期时重新访问网站刷新，使工具调用不必承担启动与登录的耗时。
+    """
+
+    def __init__(self, interval: float = 300, refresh_before: float = 86400, warm_keyword: str = ''):
+        """
+        :param interval: 检查登录状态的间隔（秒）
+        :param refresh_before: web_session cookie 剩余有效期不足该值（秒）时刷新
+        :param warm_keyword: 登录后用该关键词搜索一次以捕获会话模板，为空则不搜索
+        """
+        self.interval = interval
+        self.refresh_before = refresh_before
+        self.warm_keyword = warm_keyword
+        self._states: dict[str, dict] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._expiry_notified: set[str] = set()
+
+    @property
+    def ready(self) -> bool:
+        """至少有一个工作单元已启动并登录"""
+        return any(s['state'] == STATE_READY for s in self._states.values())
+
+    def status(self) -> dict:
+        return {'ready': self.ready, 'workers': {k: dict(v) for k, v in self._states.items()}}
+
+    async def probe_status(self) -> dict:
+        """
+        未启用后台守护时的就绪状态：对已启动的浏览器做登录探测（结果有缓存），不主动启动浏览器，
+        格式与 status 相同
+        """
+        workers = {}
+        for worker in get_dispatcher().workers:
+            if not worker.pool.started:
+                workers[worker.name] = {'state': STATE_STARTING, 'since': '', 'error': ''}
+                continue
+            try:
+                cookies = await to_thread(worker.pool.cookies)
+                logged_in = await worker.probe.check({c['name']: c['value'] for c in cookies})
+            except Exception as e:
+                workers[worker.name] = {'state': STATE_ERROR, 'since': '', 'error': str(e)}
+                continue
+            workers[worker.name] = {'state': STATE_READY if logged_in else STATE_WAITING_LOGIN,
+                                    'since': '', 'error': ''}
+        return {'ready': any(s['state'] == STATE_READY for s in workers.values()), 'workers': workers}
+
+    def _set_state(self, worker: BrowserWorker, state: str, error: str = ''):
+        old = self._states.get(worker.name)
+        if old and old['state'] == state and old['error'] == error:
+            return
+        self._states[worker.name] = {'state': state, 'since': readable_time(), 'error': error}
+        if old is None or old['state'] != state:
+            print(f'{worker.name}状态：{state} {error}'.rstrip())
+
+    def start(self):
+        """在事件循环中为每个工作单元启动守护任务，可重复调用"""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        for worker in get_dispatcher().workers:
+            self._set_state(worker, STATE_STARTING)
+            self._tasks.append(loop.create_task(self._keep(worker)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _keep(self, worker: BrowserWorker):
+        while True:
+            try:
+                await self.check(worker)
+            except Exception as e:
+                print(f'{worker.name}会话检查异常：{e}')
+                self._set_state(worker, STATE_ERROR, str(e))
+            await asyncio.sleep(self.interval)
+
+    async def check(self, worker: BrowserWorker):
+        """启动浏览器、确认登录（必要时扫码）、按需刷新cookie与会话模板"""
+        if not worker.pool.started:
+            self._set_state(worker, STATE_LAUNCHING)
+        with span('keeper_warm', worker=worker.name):
+            await worker.pool.start()
+
+        # 冷却或熔断期间只做不访问网站的检查
+        can_visit = worker.healthy and get_dispatcher().breaker.state == 'closed'
+        async with worker.pool.tab() as tab:
+            cookies = await to_thread(lambda: tab.cookies(all_domains=True, all_info=True))
+            with span('keeper_probe', worker=worker.name) as attrs:
+                logged_in = attrs['logged_in'] = await worker.probe.check(
+                    {c['name']: c['value'] for c in cookies})
+            if not logged_in:
+                if not can_visit:
+                    # 不打开网站、不发送扫码二维码，等冷却或熔断结束后的下一次检查
+                    self._set_state(worker, STATE_WAITING_LOGIN, '冷却或熔断中，暂不登录')
+                    return
+                self._set_state(worker, STATE_WAITING_LOGIN)
+                await ensure_site_page(worker, tab)
+                if not await to_thread(is_user_loggined(tab)):
+                    msg = await login_once(worker, tab)
+                    if msg:
+                        self._set_state(worker, STATE_ERROR, msg)
+                        return
+                worker.probe.mark(True)
+                self._expiry_notified.discard(worker.name)
+            elif can_visit and self._expires_in(cookies) < self.refresh_before:
+                await self._refresh(worker, tab)
+
+            if can_visit and self.warm_keyword and not worker.session.ready:
+                with span('keeper_capture', worker=worker.name) as attrs:
+                    _, msg = await search_core(worker, tab, self.warm_keyword, 'general', 0, 1)
+                    attrs['error_msg'] = msg
+                if tab.listen.listening:
+                    await to_thread(tab.listen.stop)
+        self._set_state(worker, STATE_READY)
+
+    @staticmethod
+    def _expires_in(cookies: list[dict]) -> float:
+        """web_session cookie 的剩余有效期（秒），会话cookie或没有过期时间时视为不过期"""
+        for c in cookies:
+            if c.get('name') == 'web_session' and c.get('expires'):
+                expires = float(c['expires'])
+                if expires > 0:
+                    return expires - time.time()
+        return float('inf')
+
+    async def _refresh(self, worker: BrowserWorker, tab):
+        """重新访问网站以续期cookie，并同步到会话模板；续期不成功时通知一次，提醒重新扫码"""
+        await worker.bucket.acquire()
+        with span('keeper_refresh', worker=worker.name):
+            await worker.pool.navigate(tab, f'{web_origin()}/explore')
+        cookies = await to_thread(lambda: tab.cookies(all_domains=True, all_info=True))
+        if worker.session.ready:
+            worker.session.update_cookies({c['name']: c['value'] for c in cookies})
+        left = self._expires_in(cookies)
+        if left >= self.refresh_before:
+            print(f'{worker.name}已刷新登录cookie')
+            self._expiry_notified.discard(worker.name)
+        elif worker.name not in self._expiry_notified:
+            self._expiry_notified.add(worker.name)
+            get_notifier().notify('登录即将过期',
+                                  f'- 时间: {readable_time()}\n- 浏览器: {worker.name}\n'
+                                  f'- 提示：登录将在{left / 3600:.1f}小时后过期，过期后将自动发送扫码二维码')
+
+
+_keeper: SessionKeeper | None = None
+
+
+def get_keeper() -> SessionKeeper:
+    global _keeper
+    if _keeper is None:
+        _keeper = SessionKeeper(interval=float(os.getenv('XHS_KEEPER_INTERVAL', 300)),
+                                refresh_before=float(os.getenv('XHS_COOKIE_REFRESH_BEFORE', 86400)),
+                                warm_keyword=os.getenv('XHS_WARM_KEYWORD', ''))
+    return _keeper
+
+
+registry.gauge('xhs_worker_ready', '工作单元是否已启动并登录（由后台会话守护维护）', lambda: [] if _keeper is None else [
+    ({'worker': name}, int(s['state'] == STATE_READY)) for name, s in _keeper.status()['workers'].items()])
@@ -1,44 +1,52 @@
 import asyncio
-import sys
+import os
+import time
 import typing
-from asyncio import Queue, to_thread
+from asyncio import to_thread
 from urllib.parse import urlparse
 
-from DrissionPage import ChromiumOptions, WebPage
 from DrissionPage.items import MixTab
-from lxml import html
-
-from model import DetailPageInfo
-from util import send_dingtalk_markdown, readable_time, countdown
-
-tab_q = Queue()
-
-SAFE_CHECK_TRIGGERED = False
-
-
-def get_os_type():
-    if sys.platform.startswith("darwin"):
-        return "macOS"
-    elif sys.platform.startswith("linux"):
-        return "Linux"
-    else:
-        return "Windows"
-
-
-def new_browser() -> WebPage:
-    ostyp = get_os_type()
-    print('ostyp:', ostyp)
-    # ostyp = 'Linux'
-    co = ChromiumOptions()
-    if ostyp == 'Linux':
-        co = (co.headless().set_argument('--disable-blink-features', 'AutomationControlled'))
-        co.set_argument('--no-sandbox')
-        co.set_argument('--disable-infobars')
-        co.set_argument('--enable-automation')
-    page = WebPage(chromium_options=co)
-    page.set.user_agent(
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36')
-    return page
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential, retry_if_result
+
+from comments import fetch_comments_from_tab, RateLimited
+from concurrency import SingleFlight, Batcher
+from extractor import extract_from_state, extract_from_dom
+from feed import fetch_feed_from_tab, ERR_RATE_LIMITED
+from filters import PostFilter
+from metrics import span, detail_seconds, safe_checks, cache_requests, retries, detail_api
+from model import DetailPageInfo, Comment
+from notifier import get_notifier
+from pool import get_os_type
+from session import NOTES_PATH
+from store import get_store
+from util import readable_time, async_countdown, web_origin
+from workers import BrowserWorker, get_dispatcher
+
+# 相同参数的并发搜索、相同帖子的并发详情只执行一次
+search_flight = SingleFlight()
+detail_flight = SingleFlight()
+comment_flight = SingleFlight()
+# 同一工作单元同一时间只走一次扫码流程（后台会话守护与搜索可能同时发现未登录）
+login_flight = SingleFlight()
+
+ERR_LISTEN = '监听请求失败：/search/notes'
+ERR_REQUEST = '请求失败：/search/notes'
+ERR_SAFE_CHECK = '触发安全验证'
+ERR_COOLDOWN = '安全验证冷却中，跳过详情'
+ERR_BREAKER = '频繁触发安全验证，暂停访问网站'
+# 以下错误重试也无济于事（需要人工处理或等待冷却），不再重试
+NO_RETRY_DETAIL_ERRORS = (ERR_SAFE_CHECK, ERR_COOLDOWN, ERR_BREAKER)
+
+
+def stage_retrying(stage: str, should_retry: typing.Callable[[typing.Any], bool], attempts: int) -> AsyncRetrying:
+    """
+    单个阶段的重试策略：按结果判断是否重试，重试耗尽时返回最后一次的结果而不是抛出异常
+    :param stage: 阶段名称，用于重试计数
+    """
+    return AsyncRetrying(stop=stop_after_attempt(attempts), wait=wait_exponential(multiplier=.5, max=5),
+                         retry=retry_if_result(should_retry),
+                         before_sleep=lambda state: retries.inc(stage=stage),
+                         retry_error_callback=lambda state: state.outcome.result())
 
 
 def anti_headless_check(tab: MixTab) -> bool:
@@ -59,159 +67,559 @@ def is_user_loggined(tab: MixTab, timeout: float = 5) -> typing.Callable[[], boo
     return core
 
 
-async def new_browser_and_search(search: str) -> tuple[dict, str]:
-    tab = new_browser().latest_tab
-    # tab.change_mode()  # silent mode
-    notes_api = 'edith.xiaohongshu.com/api/sns/web/v1/search/notes'
-
-    tab.get(f'https://www.xiaohongshu.com/search_result?keyword={search}')
-
-    # 若已登录，显示【我】
-    if not is_user_loggined(tab)():
-        # 若未登录，应该显示二维码
-        qrcode = tab.ele('xpath://img[@class="qrcode-img"]', timeout=5)
-        if not qrcode:
-            print(tab.user_agent)
-            anti_headless_check(tab)
-            return {}, "网页错误，请联系开发者检查"
-        qrcode = qrcode.attrs['src']  # data:image...
-        resp = send_dingtalk_markdown('扫码登录',
-                                      f'- 时间: {readable_time()}\n'
-                                      f'- OS: {get_os_type()}\n'
-                                      f'- 提示：请使用手机版小红书app扫码登录，程序等待30s',
-                                      [qrcode])
-        if resp['errcode'] != 0:
-            return {}, "发送钉钉消息失败，请联系开发者检查"
-        ok = countdown('等待扫码中', 30, is_user_loggined(tab, timeout=.1))
-        if not ok:
-            return {}, "等待登录超时，程序结束。"
-        # js读取用户信息
-        js_res = tab.run_js("x = JSON.stringify(window.__INITIAL_STATE__['user']['userInfo'].value); JSON.parse(x)",
-                            as_expr=True)
-        if js_res and js_res.get("nickname"):
-            send_dingtalk_markdown('登录成功',
-                                   f'- 时间: {readable_time()}\n- 提示：用户【{js_res.get("nickname")}】登录成功！')
-        else:
-            print('Warning：登录成功，但未能读取到用户信息！')
+async def new_browser_and_search(search: str, sort: str = 'popularity_descending',
+                                 note_type: int = 2, page: int = 1) -> tuple[dict, str]:
+    """
+    :param sort: 排序方式，见 search/notes 接口的sort字段
+    :param note_type: 0-全部 1-视频 2-图文
+    :param page: 页码，从1开始
+    """
+    # 结果与limit无关，按(search, sort, note_type, page)合并并发调用
+    return await search_flight.do((search, sort, note_type, page),
+                                  lambda: search_with_retry(search, sort, note_type, page))
+
+
+async def search_with_retry(search: str, sort: str, note_type: int, page: int) -> tuple[dict, str]:
+    """只重试搜索这一阶段，且只在监听或接口请求失败、浏览器异常时重试"""
+    async def once():
+        # 搜索不占用半开时的试探名额，留给详情（只有详情会触发安全验证）
+        if not get_dispatcher().breaker.allow(probe=False):
+            return {}, ERR_BREAKER
+        try:
+            return await new_browser_and_search_core(search, sort, note_type, page)
+        except Exception as e:
+            print(f'搜索异常：{search} 第{page}页 {e}')
+            return {}, f'搜索异常：{e}'
+
+    def should_retry(res: tuple[dict, str]) -> bool:
+        msg = res[1]
+        return msg in (ERR_LISTEN, ERR_REQUEST) or msg.startswith('搜索异常')
+
+    return await stage_retrying('search', should_retry, int(os.getenv('XHS_SEARCH_RETRIES', 2)) + 1)(once)
+
+
+async def new_browser_and_search_core(search: str, sort: str, note_type: int, page: int) -> tuple[dict, str]:
+    worker = get_dispatcher().pick(prefer_session=True)
+    if worker is None:
+        return {}, "所有账号均处于安全验证冷却中，请稍后再试"
+    # 已有会话模板时直接请求接口，被拒绝才回退到浏览器流程
+    if worker.session.ready:
+        with span('search_api', keyword=search, page=page, worker=worker.name) as attrs:
+            data = await worker.session.search(search, sort=sort, note_type=note_type, page=page)
+            attrs['ok'] = bool(data)
+        if data:
+            return data, ''
+    async with worker.pool.tab() as tab:
+        try:
+            return await search_core(worker, tab, search, sort, note_type, page)
+        finally:
+            if tab.listen.listening:
+                await to_thread(tab.listen.stop)
+
+
+async def login_by_qrcode(worker: BrowserWorker, tab: MixTab) -> str:
+    """
+    扫码登录：将二维码发送到钉钉并等待扫码
+    :return: 失败原因，为空表示登录成功
+    """
+    # 若未登录，应该显示二维码
+    qrcode = await to_thread(tab.ele, 'xpath://img[@class="qrcode-img"]', timeout=5)
+    if not qrcode:
+        print(await to_thread(lambda: tab.user_agent))
+        await to_thread(anti_headless_check, tab)
+        return "网页错误，请联系开发者检查"
+    qrcode = qrcode.attrs['src']  # data:image...
+    resp = await get_notifier().send('扫码登录',
+                                     f'- 时间: {readable_time()}\n'
+                                     f'- OS: {get_os_type()}\n'
+                                     f'- 浏览器: {worker.name}\n'
+                                     f'- 提示：请使用手机版小红书app扫码登录，程序等待30s',
+                                     [qrcode])
+    if resp['errcode'] != 0:
+        return "发送钉钉消息失败，请联系开发者检查"
+    ok = await async_countdown('等待扫码中', 30, is_user_loggined(tab, timeout=.1))
+    if not ok:
+        return "等待登录超时，程序结束。"
+    # js读取用户信息
+    js_res = await to_thread(tab.run_js,
+                             "x = JSON.stringify(window.__INITIAL_STATE__['user']['userInfo'].value); JSON.parse(x)",
+                             as_expr=True)
+    if js_res and js_res.get("nickname"):
+        get_notifier().notify('登录成功',
+                              f'- 时间: {readable_time()}\n- 提示：用户【{js_res.get("nickname")}】登录成功！')
+    else:
+        print('Warning：登录成功，但未能读取到用户信息！')
+    return ''
 
-    tab.listen.start(notes_api)
-    # 访问搜索页
-    tab.get(f'https://www.xiaohongshu.com/search_result?keyword={search}')
 
-    packet = tab.listen.wait(timeout=5)
+async def login_once(worker: BrowserWorker, tab: MixTab) -> str:
+    """扫码登录，同一工作单元已在扫码时等待其结果，不再发送第二个二维码"""
+    return await login_flight.do(worker.name, lambda: login_by_qrcode(worker, tab))
+
+
+async def search_core(worker: BrowserWorker, tab: MixTab, search: str, sort: str, note_type: int,
+                      page: int) -> tuple[dict, str]:
+    # tab.change_mode()  # silent mode
+    search_url = f'{web_origin()}/search_result?keyword={search}'
+    # 所有浏览器调用都是阻塞的，统一放到线程中执行，避免卡住事件循环
+    # 先通过cookie与轻量接口判断登录状态（结果短时缓存），不必为此加载页面
+    probe = worker.probe
+    with span('login_probe', keyword=search, worker=worker.name) as attrs:
+        cookies = await to_thread(lambda: tab.cookies(all_domains=True).as_dict())
+        logged_in = attrs['logged_in'] = await probe.check(cookies)
+
+    # 在唯一一次导航前开启监听
+    await to_thread(tab.listen.start, NOTES_PATH)
+    # 访问搜索页
+    await worker.bucket.acquire()
+    with span('search_page', keyword=search, worker=worker.name):
+        await worker.pool.navigate(tab, search_url)
+
+    # 探测失败时才检查页面（若已登录，显示【我】），确实未登录再走扫码流程
+    if not logged_in and not await to_thread(is_user_loggined(tab)):
+        with span('qrcode_login', worker=worker.name) as attrs:
+            msg = attrs['error_msg'] = await login_once(worker, tab)
+        if msg:
+            return {}, msg
+        probe.mark(True)
+        # 丢弃登录前的数据包，重新访问搜索页
+        await to_thread(tab.listen.clear)
+        with span('search_page', keyword=search, worker=worker.name, after_login=True):
+            await worker.pool.navigate(tab, search_url)
+
+    with span('listen_wait', keyword=search, worker=worker.name) as attrs:
+        packet = await to_thread(tab.listen.wait, timeout=5)
+        attrs['ok'] = bool(packet)
     if (not packet or packet.response.status != 200 or
             not isinstance(packet.response.body, dict)
             or packet.response.body['code'] != 0):
         # 检查浏览器是否触发验证，需手动处理
-        print('Error: 错误的body格式', packet.response.body, type(packet.response.body))
-        return {}, f"监听请求失败：/search/notes"
+        body = packet.response.body if packet else None
+        print('Error: 错误的body格式', body, type(body))
+        probe.invalidate()
+        return {}, ERR_LISTEN
+    probe.mark(True)
 
+    # 捕获会话模板，后续关键词直接请求接口
     req = packet.request
-    req.postData['sort'] = 'popularity_descending'
-    req.postData['note_type'] = 2  # 图文
-    headers = dict(req.headers)
-    headers.pop('content-length')
-    resp = tab.post('https://' + notes_api, headers=headers, cookies=tab.cookies().as_dict(), json=req.postData,
-                    timeout=3)
-    if not resp or resp.status_code != 200:
-        return {}, f"请求失败：{resp.status_code}"
-    return resp.json(), ''
+    cookies = await to_thread(lambda: tab.cookies().as_dict())
+    session = worker.session
+    session.capture(dict(req.headers), cookies, req.postData)
+    with span('search_api', keyword=search, page=page, worker=worker.name, after_capture=True) as attrs:
+        data = await session.search(search, sort=sort, note_type=note_type, page=page)
+        attrs['ok'] = bool(data)
+    if not data:
+        return {}, ERR_REQUEST
+    return data, ''
 
 
 async def fetch_posts_detail_core(i: int, url: str) -> DetailPageInfo:
-    if SAFE_CHECK_TRIGGERED:
-        return DetailPageInfo()
-    tab: MixTab = await tab_q.get()
-    await asyncio.to_thread(tab.get, url)
+    # 每个详情任务单独分配给当前负载最低的健康工作单元
+    worker = get_dispatcher().pick()
+    if worker is None:
+        return DetailPageInfo(error=ERR_COOLDOWN)
+    limiter = worker.limiter
+    async with limiter.slot() as slot:
+        if limiter.paused:  # 排队期间可能已触发验证
+            return DetailPageInfo(error=ERR_COOLDOWN)
+        await worker.bucket.acquire()
+        async with worker.pool.tab() as tab:
+            start = time.monotonic()
+            info = await fetch_posts_detail_from_tab(worker, tab, i, url)
+            if not info.error:
+                slot['latency'] = time.monotonic() - start
+                detail_seconds.observe(slot['latency'], worker=worker.name)
+            return info
+
+
+async def fetch_posts_detail_from_tab(worker: BrowserWorker, tab: MixTab, i: int, url: str) -> DetailPageInfo:
+    note_id = urlparse(url).path.split('/')[-1]
+    with span('detail_page', note_id=note_id, worker=worker.name):
+        await worker.pool.navigate(tab, url)
+
+    if await safe_check_triggered(worker, tab):
+        return DetailPageInfo(error=ERR_SAFE_CHECK)
+    get_dispatcher().breaker.record_success()
+
+    # 优先从页面状态中一次性读取，读不到再走DOM解析
+    with span('detail_extract', note_id=note_id) as attrs:
+        info = await extract_from_state(tab, note_id, url)
+        attrs['source'] = 'state'
+        if info is None:
+            print(f'页面状态不可用，使用DOM解析：{note_id}')
+            info = await extract_from_dom(tab, note_id, url)
+            attrs['source'] = 'dom'
 
-    if await safe_check_triggered(tab):
-        return DetailPageInfo()
+    print(f'获取到第{i}个详情')
+    return info
+
+
+def detail_url(note_id: str, xsec_token: str) -> str:
+    return f'{web_origin()}/search_result/{note_id}?xsec_token={xsec_token}&xsec_source=pc_search'
+
+
+async def fetch_post_detail(i: int, note_id: str, xsec_token: str, refresh: bool = False) -> DetailPageInfo:
+    """
+    获取单个帖子的详情：先查本地存储；已在其他调用中进行的帖子直接等待其结果
+    :param refresh: 忽略本地存储重新获取（结果仍会写入存储）
+    """
+    store = get_store()
+    if not refresh:
+        cached = await to_thread(store.get_many, [note_id])
+        if note_id in cached:
+            cache_requests.inc(cache='detail_store', result='hit')
+            print(f'详情命中本地存储：{note_id}')
+            return cached[note_id]
+        cache_requests.inc(cache='detail_store', result='miss')
+
+    async def core():
+        # 优先通过feed接口获取，失败再打开详情页
+        info = await fetch_post_detail_by_api(note_id, xsec_token)
+        if info is None:
+            info = await fetch_post_detail_with_retry(i, note_id, detail_url(note_id, xsec_token))
+        if not info.error:
+            await to_thread(store.put_many, [info])
+        return info
+
+    return await detail_flight.do(note_id, core)
+
+
+class FeedDetailSource:
+    """
+    通过feed接口获取详情：短时间内的多个帖子合并为一批，借一个已登录的标签页在一次JS调用中请求，
+    省去每个帖子一次的详情页加载。整批都被拒绝时暂停使用一段时间，期间全部回退到详情页；
+    因访问频率被拒绝时按触发安全验证处理，不再回退到详情页。
+    """
+
+    def __init__(self, enabled: bool = True, max_batch: int = 10, window: float = .05, cooldown: float = 600):
+        """
+        :param enabled: 是否启用，关闭时全部打开详情页
+        :param max_batch: 每批最多的帖子数
+        :param window: 凑批的等待时间（秒）
+        :param cooldown: 整批被拒绝后暂停使用的时间（秒）
+        """
+        self.enabled = enabled
+        self.cooldown = cooldown
+        self.paused_until = 0.0
+        self._batcher = Batcher(self._fetch_batch, max_size=max_batch, window=window)
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and time.monotonic() >= self.paused_until
+
+    async def fetch(self, note_id: str, xsec_token: str) -> DetailPageInfo | None:
+        """:return: 详情，获取失败时返回None，由调用方回退到详情页；访问频次异常时返回带error的详情"""
+        if not self.available:
+            return None
+        info = await self._batcher.submit((note_id, xsec_token))
+        detail_api.inc(result='fallback' if info is None else 'rejected' if info.error else 'ok')
+        return info
+
+    async def _fetch_batch(self, notes: list[tuple[str, str]]) -> list[DetailPageInfo | None]:
+        dispatcher = get_dispatcher()
+        worker = dispatcher.pick()
+        # 不占用半开时的试探名额：整批失败时没有结果可记录，试探名额应留给回退的详情页
+        if worker is None or not dispatcher.breaker.allow(probe=False):
+            return [None] * len(notes)
+        # 一批接口请求占用一个详情并发名额，按一次页面访问限速
+        async with worker.limiter.slot():
+            if worker.limiter.paused:  # 排队期间可能已触发验证
+                return [None] * len(notes)
+            await worker.bucket.acquire()
+            async with worker.pool.tab() as tab:
+                await ensure_site_page(worker, tab)
+                with span('detail_api', worker=worker.name, notes=len(notes)) as attrs:
+                    results = await fetch_feed_from_tab(tab, [(n, t, detail_url(n, t)) for n, t in notes])
+                    attrs['ok'] = sum(v is not None and not v.error for v in results)
+        if any(v is not None and v.error == ERR_RATE_LIMITED for v in results):
+            # 此时打开详情页同样会触发验证，未获取到的帖子都直接返回失败
+            report_safe_check(worker, 'feed接口访问频次异常')
+            return [v if v is not None and not v.error else DetailPageInfo(note_id=n, error=ERR_SAFE_CHECK)
+                    for (n, _), v in zip(notes, results)]
+        if any(results):
+            dispatcher.breaker.record_success()
+        else:
+            self.paused_until = time.monotonic() + self.cooldown
+            print(f'feed接口整批失败，{self.cooldown:g}s内改为打开详情页')
+        return results
 
-    note_id = urlparse(url).path.split('/')[-1]
 
-    desc = await to_thread(tab, 'xpath://div[@id="detail-desc"]/span[@class="note-text"]/span[1]', timeout=5)
-    desc = desc.text if desc else ''
+_feed_source: FeedDetailSource | None = None
 
-    tree = html.fromstring(tab.html)
-    player = tree.xpath('//video[@mediatype="video"]')
 
-    video_url = ''
-    if player:
-        video_url = player[0].get('src', '').removeprefix('blob:')
-    tags = tree.xpath('//div[@id="detail-desc"]/span[@class="note-text"]/a[@id="hash-tag"]')
-    if tags:
-        tags = [tag.text for tag in tags]
-    await tab_q.put(tab)
+def get_feed_source() -> FeedDetailSource:
+    global _feed_source
+    if _feed_source is None:
+        _feed_source = FeedDetailSource(enabled=os.getenv('XHS_DETAIL_API', '1') == '1',
+                                        max_batch=int(os.getenv('XHS_DETAIL_API_BATCH', 10)),
+                                        window=float(os.getenv('XHS_DETAIL_API_WINDOW', .05)),
+                                        cooldown=float(os.getenv('XHS_DETAIL_API_COOLDOWN', 600)))
+    return _feed_source
 
-    print(f'获取到第{i}个详情')
-    return DetailPageInfo(
-        note_id=note_id,
-        url=url,
-        video_url=video_url,
-        desc=desc,
-        tags=tags
-    )
-
-
-async def fetch_posts_detail(items: dict) -> dict[str, DetailPageInfo]:
-    tab_list = []
-    for _ in range(3):  # 详情页的并发数
-        t = new_browser().new_tab()
-        t.set.load_mode.none()
-        tab_list.append(t)
-        await tab_q.put(t)
-
-    urls = []
-    for note_id, xsec_token in items.items():
-        u = f'https://www.xiaohongshu.com/search_result/{note_id}?xsec_token={xsec_token}&xsec_source=pc_search'
-        urls.append(u)
-
-    global SAFE_CHECK_TRIGGERED
-    SAFE_CHECK_TRIGGERED = False
+
+async def fetch_post_detail_by_api(note_id: str, xsec_token: str) -> DetailPageInfo | None:
+    """通过feed接口获取单个帖子的详情（与同一时间的其他帖子合并请求），失败返回None"""
+    try:
+        return await get_feed_source().fetch(note_id, xsec_token)
+    except Exception as e:
+        print(f'通过feed接口获取详情异常：{note_id} {e}')
+        return None
+
+
+async def fetch_post_detail_with_retry(i: int, note_id: str, url: str) -> DetailPageInfo:
+    """只重试失败的这一个帖子；触发安全验证、冷却或熔断时不再重试"""
+    async def once():
+        if not get_dispatcher().breaker.allow():
+            return DetailPageInfo(note_id=note_id, error=ERR_BREAKER)
+        try:
+            return await fetch_posts_detail_core(i, url)
+        except Exception as e:
+            print(f'获取详情异常：{note_id} {e}')
+            return DetailPageInfo(note_id=note_id, error=f'获取详情异常：{e}')
+
+    def should_retry(info: DetailPageInfo) -> bool:
+        return bool(info.error) and info.error not in NO_RETRY_DETAIL_ERRORS
+
+    return await stage_retrying('detail', should_retry, int(os.getenv('XHS_DETAIL_RETRIES', 2)) + 1)(once)
+
+
+async def fetch_posts_detail(items: dict, refresh: bool = False) -> dict[str, DetailPageInfo]:
+    """
+    :param items: {note_id: xsec_token}
+    :param refresh: 忽略本地存储重新获取
+    """
+    # 详情页的并发数由各工作单元的自适应并发控制器决定
+    for worker in get_dispatcher().workers:
+        await worker.pool.start()
 
     # 创建任务列表
-    tasks = [fetch_posts_detail_core(i, url) for i, url in enumerate(urls)]
+    tasks = [fetch_post_detail(i, note_id, xsec_token, refresh)
+             for i, (note_id, xsec_token) in enumerate(items.items())]
 
     # 并发运行任务
     results: list[DetailPageInfo] = await asyncio.gather(*tasks)
-    ret = {v.note_id: v for v in results}
+    failed = [v.error for v in results if v.error]
+    if failed:
+        print(f'详情获取失败{len(failed)}个：{set(failed)}')
+    ret = {v.note_id: v for v in results if not v.error}
+    return ret
+
 
-    await quit_browser(tab_list)
+async def ensure_site_page(worker: BrowserWorker, tab: MixTab):
+    """页内请求接口需要站点的页面环境（cookie与签名函数），借到的标签页若还是空白页才导航一次"""
+    if (await to_thread(lambda: tab.url) or '').startswith(web_origin()):
+        return
+    await worker.bucket.acquire()
+    with span('site_page', worker=worker.name):
+        await worker.pool.navigate(tab, f'{web_origin()}/explore')
+
+
+async def fetch_post_comments(note_id: str, xsec_token: str, limit: int) -> list[Comment]:
+    """获取单个帖子的前limit条评论：先查本地存储，否则在已登录的标签页中请求评论接口"""
+    store = get_store()
+    cached = await to_thread(store.get_comments, [note_id], limit)
+    if note_id in cached:
+        cache_requests.inc(cache='comment_store', result='hit')
+        return cached[note_id]
+    cache_requests.inc(cache='comment_store', result='miss')
+
+    async def core():
+        dispatcher = get_dispatcher()
+        worker = dispatcher.pick()
+        # 评论是附带数据，不占用半开时的试探名额
+        if worker is None or not dispatcher.breaker.allow(probe=False):
+            return []
+        # 与详情共用并发名额，一个帖子的评论按一次页面访问限速
+        async with worker.limiter.slot():
+            if worker.limiter.paused:  # 排队期间可能已触发验证
+                return []
+            await worker.bucket.acquire()
+            async with worker.pool.tab() as tab:
+                await ensure_site_page(worker, tab)
+                with span('comments', note_id=note_id, worker=worker.name) as attrs:
+                    try:
+                        res = await fetch_comments_from_tab(tab, note_id, xsec_token, limit)
+                    except RateLimited:
+                        report_safe_check(worker, '评论接口访问频次异常')
+                        return []
+                    attrs['count'] = len(res[0]) if res else 0
+        if res is None:
+            return []
+        await to_thread(store.put_comments, note_id, *res)
+        return res[0]
+
+    return await comment_flight.do((note_id, limit), core)
+
+
+async def fetch_posts_comments(items: dict, limit: int) -> dict[str, list[Comment]]:
+    """
+    并发获取多个帖子的评论，并发数受各工作单元的标签页池限制
+    :param items: {note_id: xsec_token}
+    :param limit: 每个帖子最多获取的评论数
+    """
+    note_ids = list(items)
+    results = await asyncio.gather(*[fetch_post_comments(n, items[n], limit) for n in note_ids],
+                                   return_exceptions=True)
+    ret = {}
+    for note_id, res in zip(note_ids, results):
+        if isinstance(res, Exception):
+            print(f'获取评论失败：{note_id} {res}')
+            continue
+        ret[note_id] = res
     return ret
 
 
-async def safe_check_triggered(tab: MixTab) -> bool:
-    if tab.title == '安全验证':
-        global SAFE_CHECK_TRIGGERED
-        SAFE_CHECK_TRIGGERED = True
-        print('触发滑动验证！！！请手动访问小红书网站处理')
-        send_dingtalk_markdown('触发验证',
-                               f'- 时间：{readable_time()}\n- 提示：账户触发滑动验证码，请手动访问小红书网站处理！')
+def is_valid_item(item: dict) -> bool:
+    """与 MultiPost 的过滤规则一致：只保留有标题的笔记"""
+    return item.get('model_type') == 'note' and bool(item.get('id')) and \
+        bool(item.get('note_card', {}).get('display_title'))
+
+
+async def iter_search_items(search: str, sort: str = 'popularity_descending', note_type: int = 2,
+                            max_pages: int = 5) -> typing.AsyncIterator[list[dict]]:
+    """
+    逐页获取搜索结果，直到没有更多结果或达到max_pages
+    :return: 每次产出一页的items
+    """
+    for page in range(1, max_pages + 1):
+        data, msg = await new_browser_and_search(search, sort, note_type, page)
+        if msg:
+            if page == 1:
+                raise Exception(msg)
+            print(f'获取第{page}页失败，停止翻页：{msg}')
+            return
+        data = data.get('data', {})
+        items = data.get('items') or []
+        yield items
+        if not items or not data.get('has_more'):
+            return
+
+
+async def iter_valid_items(search: str, limit: int, sort: str = 'popularity_descending', note_type: int = 2,
+                           post_filter: PostFilter | None = None) -> typing.AsyncIterator[dict]:
+    """
+    逐条产出有效、不重复且满足过滤条件的帖子，直到凑够limit条或没有更多结果
+    :param post_filter: 按搜索结果中的互动数、发布时间与类型过滤，有过滤条件时会多翻页以凑够数量
+    """
+    if limit <= 0:
+        return
+    seen = set()
+    max_pages = limit // 20 + 2  # 每页约20条，额外多翻一页以弥补被过滤掉的结果
+    if post_filter is not None and post_filter.active:
+        max_pages = max(max_pages, int(os.getenv('XHS_FILTER_MAX_PAGES', 10)))
+    found = skipped = 0
+    async for page_items in iter_search_items(search, sort, note_type, max_pages):
+        for item in page_items:
+            if not is_valid_item(item) or item['id'] in seen:
+                continue
+            seen.add(item['id'])
+            if post_filter is not None and not post_filter.match(item):
+                skipped += 1
+                continue
+            yield item
+            found += 1
+            if found >= limit:
+                return
+        # 按时间倒序时，一整页都早于时间范围，后面的只会更早
+        if sort == 'time_descending' and post_filter is not None and page_items and \
+                all(post_filter.too_old(v) for v in page_items):
+            print(f'【{search}】之后的帖子都早于{post_filter.published_after}，停止翻页')
+            return
+    if skipped:
+        print(f'【{search}】有{skipped}个帖子不满足过滤条件，未获取详情')
+
+
+async def stream_posts(search: str, limit: int, sort: str = 'popularity_descending', note_type: int = 2,
+                       on_detail: typing.Callable[[int, int, dict, DetailPageInfo], typing.Awaitable] = None,
+                       post_filter: PostFilter | None = None) -> tuple[list[dict], dict[str, DetailPageInfo]]:
+    """
+    流水线式获取帖子：翻页获取搜索结果，每拿到一条有效帖子就立即发起详情获取，详情完成时回调on_detail
+    :param limit: 需要的帖子数量
+    :param on_detail: 回调 (已完成数, 总数, 搜索item, 详情)
+    :param post_filter: 获取详情之前的过滤条件，见 iter_valid_items
+    :return: (搜索items, 详情dict)
+    """
+    items = []
+    tasks: dict[asyncio.Task, dict] = {}
+    async for item in iter_valid_items(search, limit, sort, note_type, post_filter):
+        items.append(item)
+        task = asyncio.create_task(fetch_post_detail(len(items) - 1, item['id'], item['xsec_token']))
+        tasks[task] = item
+
+    detail_dict = {}
+    failed = []
+    done = 0
+    pending = set(tasks)
+    while pending:
+        finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            info = task.result()
+            done += 1
+            if info.error:
+                failed.append(info.error)
+            else:
+                detail_dict[info.note_id] = info
+            if on_detail:
+                await on_detail(done, len(items), tasks[task], info)
+    if failed:
+        print(f'详情获取失败{len(failed)}个：{set(failed)}')
+    return items, detail_dict
+
+
+async def batch_posts(searches: list[str], limit: int, sort: str = 'popularity_descending', note_type: int = 2,
+                      post_filter: PostFilter | None = None) -> dict[str, tuple[list[dict], dict[str, DetailPageInfo]]]:
+    """
+    多关键词批量获取：共享标签页池与会话模板完成所有关键词的搜索，合并去重后每个帖子只获取一次详情
+    :param post_filter: 获取详情之前的过滤条件，见 iter_valid_items
+    :return: {关键词: (搜索items, 详情dict)}
+    """
+
+    async def collect(search: str) -> list[dict]:
+        """单个关键词的搜索失败不影响其他关键词，记为没有结果"""
+        try:
+            return [item async for item in iter_valid_items(search, limit, sort, note_type, post_filter)]
+        except Exception as e:
+            print(f'关键词【{search}】搜索失败：{e}')
+            return []
+
+    searches = list(dict.fromkeys(searches))
+    items_by_search = {}
+    rest = searches
+    if not get_dispatcher().session_ready and searches:
+        # 先用一个关键词捕获会话模板，其余关键词即可直接请求接口，不必各开一次搜索页
+        items_by_search[searches[0]] = await collect(searches[0])
+        rest = searches[1:]
+    results = await asyncio.gather(*[collect(s) for s in rest])
+    items_by_search.update(zip(rest, results))
+
+    all_items = {item['id']: item['xsec_token'] for items in items_by_search.values() for item in items}
+    total = sum(len(v) for v in items_by_search.values())
+    print(f'{len(searches)}个关键词共{total}个帖子，去重后需获取{len(all_items)}个详情')
+    detail_dict = await fetch_posts_detail(all_items)
+    return {s: (items_by_search[s], {v['id']: detail_dict[v['id']] for v in items_by_search[s]
+                                     if v['id'] in detail_dict})
+            for s in searches}
+
+
+def report_safe_check(worker: BrowserWorker, reason: str):
+    """工作单元被网站限制访问：进入冷却期（期间不再分配任务）、计入熔断并通知"""
+    worker.limiter.on_safe_check()
+    get_dispatcher().breaker.record_failure()
+    safe_checks.inc(worker=worker.name)
+    print(f'{worker.name}{reason}！！！请手动访问小红书网站处理')
+    # 多个标签页同时触发时，通知会在后台合并为一条
+    get_notifier().notify('触发验证',
+                          f'- 时间：{readable_time()}\n- 浏览器: {worker.name}\n'
+                          f'- 提示：账户{reason}，请手动访问小红书网站处理！')
+
+
+async def safe_check_triggered(worker: BrowserWorker, tab: MixTab) -> bool:
+    if await to_thread(lambda: tab.title) == '安全验证':
+        report_safe_check(worker, '触发滑动验证码')
         return True
     return False
 
 
-def clean_browser_tab():
-    try:
-        tab_list = new_browser().get_tabs()
-        if tab_list:
-            tab_list = tab_list[:-1]  # 保留1个
-            for t in tab_list:
-                t.close()
-    except Exception as e:
-        print(f'关闭浏览器异常: {e}')
-
-
-async def quit_browser(tab_list: list[MixTab]):
-    try:
-        # 释放资源
-        for t in tab_list:
-            t.close()
-        # new_browser().quit()
-    except Exception as e:
-        print(f'退出异常: {e}')
-
-
 async def main():
     try:
         data, msg = await new_browser_and_search('装机')
@@ -1,53 +1,329 @@
+import asyncio
+import json
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-from mcp.server.fastmcp import FastMCP
-from tenacity import retry, stop_after_attempt, wait_fixed
+from mcp.server.fastmcp import FastMCP, Context
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, JSONResponse
 
-from logic import new_browser_and_search, fetch_posts_detail, clean_browser_tab
-from model import MultiPost
-from util import tool_hook_before, load_env
+from cache import ResultCache
+from concurrency import Overloaded
+from filters import PostFilter
+from governor import admitted, get_governor
+from keeper import get_keeper
+from logic import stream_posts, batch_posts, fetch_posts_comments
+from metrics import registry, span
+from model import MultiPost, DetailPageInfo, DEFAULT_FIELDS, FIELD_LABELS, OUTPUT_FORMATS, fit_max_chars
+from notifier import get_notifier
+from store import get_store
+from util import load_env
+from watch import watch_posts
+from workers import get_dispatcher
 
 load_env()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+result_cache = ResultCache(ttl=float(os.getenv('XHS_CACHE_TTL', 600)),
+                           max_entries=int(os.getenv('XHS_CACHE_MAX_ENTRIES', 256)),
+                           max_bytes=int(os.getenv('XHS_CACHE_MAX_BYTES', 32 << 20)),
+                           path=os.getenv('XHS_CACHE_PATH', ''),
+                           flush_interval=float(os.getenv('XHS_CACHE_FLUSH_INTERVAL', 5)))
+registry.gauge('xhs_result_cache_entries', '搜索结果缓存的条目数', lambda: [({}, result_cache.stats()['entries'])])
+registry.gauge('xhs_result_cache_bytes', '搜索结果缓存的字节数（按pickle后的大小估算）', lambda: [
+    ({}, result_cache.stats()['bytes'])])
+
 mcp = FastMCP("XhsServer", host="0.0.0.0", port=9090)
 
 url = "https://edith.xiaohongshu.com/api/sns/web/v1/search/notes"
 
 
+def check_output_args(output_format: str, fields: list[str] | None) -> str:
+    """:return: 参数错误信息，为空表示参数正确"""
+    if output_format not in OUTPUT_FORMATS:
+        return f"Error: 输出格式只能是{'、'.join(OUTPUT_FORMATS)}"
+    unknown = [f for f in fields or [] if f not in FIELD_LABELS]
+    if unknown:
+        return f"Error: 未知的字段{unknown}，可选字段：{'、'.join(FIELD_LABELS)}"
+    return ''
+
+
+def output_fields(fields: list[str] | None, comment_limit: int) -> tuple:
+    """未指定字段时使用默认字段；需要评论时附带评论（指定了字段但没有comments时也追加）"""
+    fields = tuple(fields) if fields else DEFAULT_FIELDS
+    if comment_limit and 'comments' not in fields:
+        fields += ('comments',)
+    return fields
+
+
 @mcp.tool()
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(.2),
-       before=tool_hook_before(logger, logging.INFO, [clean_browser_tab]))
-async def fetch_xhs_hot_post(search: str, limit: int = 5) -> str | Exception:
+async def fetch_xhs_hot_post(search: str, limit: int = 5, sort: str = 'popularity_descending',
+                             note_type: int = 2, output_format: str = 'markdown', fields: list[str] = None,
+                             max_chars: int = 0, comment_limit: int = 0, min_liked: int = 0, min_collected: int = 0,
+                             min_comments: int = 0, max_age_days: int = 0, published_after: str = '',
+                             published_before: str = '', ctx: Context = None) -> str | Exception:
     """
-    从 小红书 获取爆款帖子数据
+    从 小红书 获取爆款帖子数据，支持翻页；获取过程中会通过进度通知逐篇返回已完成的帖子
     :param search: 搜索主题，长度不超过15个字
-    :param limit: 获取帖子数量，较多会增加耗时，不超过10
-    :return: markdown形式的帖子数据
+    :param limit: 获取帖子数量，较多会增加耗时，不超过50
+    :param sort: 排序方式：general-综合 popularity_descending-最热 time_descending-最新
+    :param note_type: 帖子类型：0-全部 1-视频 2-图文
+    :param output_format: 输出格式：markdown、json（紧凑的json数组）、ndjson（每行一篇帖子的json）
+    :param fields: 输出的字段，为空则输出默认字段。可选：title desc note_id url publish_time last_update_time
+        ip_location publish_user_name publish_user_id ptype liked_count collected_count comment_count shared_count
+        tags cover_url video_url images comments
+    :param max_chars: 输出的字符数上限，超出时在各帖子间公平地截断正文，0表示不限制
+    :param comment_limit: 每篇帖子获取的热门评论数，0表示不获取，不超过50
+    :param min_liked: 最少点赞数，0表示不限制
+    :param min_collected: 最少收藏数，0表示不限制
+    :param min_comments: 最少评论数，0表示不限制
+    :param max_age_days: 只要最近N天内发布的帖子，0表示不限制
+    :param published_after: 只要该日期（含）之后发布的帖子，格式YYYY-MM-DD，为空表示不限制
+    :param published_before: 只要该日期（含）之前发布的帖子，格式YYYY-MM-DD，为空表示不限制
+    :return: 指定格式的帖子数据，过滤条件在获取详情之前生效，会多翻页以凑够limit篇满足条件的帖子
     """
     if len(search) > 15:
         return "Error: 搜索字符串长度不能超过15个字"
-    data, msg = await new_browser_and_search(search)
+    if not 1 <= limit <= 50:
+        return "Error: 获取帖子数量需在1~50之间"
+    if not 0 <= comment_limit <= 50:
+        return "Error: 每篇帖子的评论数需在0~50之间"
+    msg = check_output_args(output_format, fields)
     if msg:
-        raise Exception(msg)
-    if not data or not data.get('data', {}).get('items'):
-        return Exception('无数据')
-    items = data.get('data', {}).get('items')
-    if len(items) > limit:
-        items = items[:limit]
-
-    detail_dict = await fetch_posts_detail({v['id']: v['xsec_token'] for v in items})
-    output = await MultiPost(items, detail_dict).to_markdown()
-    if output:
+        return msg
+    try:
+        post_filter = PostFilter.parse(note_type, min_liked, min_collected, min_comments, max_age_days,
+                                       published_after, published_before)
+    except ValueError as e:
+        return f"Error: {e}"
+    fields = output_fields(fields, comment_limit)
+    key = (search, limit, sort, note_type, comment_limit, post_filter.key())
+    multi = result_cache.get(key)
+    if multi is not None:
+        print(f'命中缓存：{key}')
+        return multi.render(output_format, fields, max_chars)
+
+    async def on_detail(done: int, total: int, item: dict, info: DetailPageInfo):
+        if ctx is None:
+            return
+        await ctx.report_progress(done, total)
+        partial = MultiPost([item], {info.note_id: info})
+        if partial.posts:
+            # ndjson 时每条通知正好是一行，客户端可以直接逐行解析
+            fmt = 'ndjson' if output_format != 'markdown' else 'markdown'
+            prefix = '' if fmt == 'ndjson' else f'[{done}/{total}]\n'
+            await ctx.info(prefix + partial.render(fmt, fields))
+
+    try:
+        async with admitted('fetch_xhs_hot_post'):
+            with span('tool', keyword=search, limit=limit) as attrs:
+                items, detail_dict = await stream_posts(search, limit, sort, note_type, on_detail, post_filter)
+                attrs.update(items=len(items), details=len(detail_dict))
+            if not items:
+                return Exception('无数据')
+            comment_dict = {}
+            if comment_limit:
+                with span('comments_all', keyword=search, posts=len(items)):
+                    comment_dict = await fetch_posts_comments({v['id']: v['xsec_token'] for v in items},
+                                                              comment_limit)
+    except Overloaded as e:
+        return f'Error: {e}'
+    with span('render', keyword=search, posts=len(items)):
+        multi = MultiPost(items, detail_dict, comment_dict)
+        output = multi.render(output_format, fields, max_chars)
+    if multi.posts:
+        result_cache.put(key, multi)
         print(f'本次调用成功，返回{len(detail_dict)}个结果')
     else:
         print('本次调用失败')
     return output
 
 
+@mcp.tool()
+async def fetch_xhs_hot_posts_batch(searches: list[str], limit: int = 5, sort: str = 'popularity_descending',
+                                    note_type: int = 2, output_format: str = 'markdown', fields: list[str] = None,
+                                    max_chars: int = 0, comment_limit: int = 0, min_liked: int = 0,
+                                    min_collected: int = 0, min_comments: int = 0, max_age_days: int = 0,
+                                    published_after: str = '', published_before: str = '') -> str:
+    """
+    从 小红书 批量获取多个关键词的爆款帖子数据，多个关键词共享一次爬取，重复的帖子只获取一次
+    :param searches: 搜索主题列表，每个长度不超过15个字，最多30个
+    :param limit: 每个关键词获取的帖子数量，不超过20
+    :param sort: 排序方式：general-综合 popularity_descending-最热 time_descending-最新
+    :param note_type: 帖子类型：0-全部 1-视频 2-图文
+    :param output_format: 输出格式：markdown、json（以关键词为键的json对象）、ndjson（每行一篇帖子，带keyword字段）
+    :param fields: 输出的字段，为空则输出默认字段，可选字段同 fetch_xhs_hot_post
+    :param max_chars: 输出的字符数上限，由各关键词平分，超出时截断正文，0表示不限制
+    :param comment_limit: 每篇帖子获取的热门评论数，0表示不获取，不超过20
+    :param min_liked: 最少点赞数，0表示不限制
+    :param min_collected: 最少收藏数，0表示不限制
+    :param min_comments: 最少评论数，0表示不限制
+    :param max_age_days: 只要最近N天内发布的帖子，0表示不限制
+    :param published_after: 只要该日期（含）之后发布的帖子，格式YYYY-MM-DD，为空表示不限制
+    :param published_before: 只要该日期（含）之前发布的帖子，格式YYYY-MM-DD，为空表示不限制
+    :return: 按关键词分组的帖子数据
+    """
+    if not searches or len(searches) > 30:
+        return "Error: 关键词数量需在1~30个之间"
+    if any(len(s) > 15 for s in searches):
+        return "Error: 搜索字符串长度不能超过15个字"
+    if not 1 <= limit <= 20:
+        return "Error: 每个关键词获取帖子数量需在1~20之间"
+    if not 0 <= comment_limit <= 20:
+        return "Error: 每篇帖子的评论数需在0~20之间"
+    msg = check_output_args(output_format, fields)
+    if msg:
+        return msg
+    try:
+        post_filter = PostFilter.parse(note_type, min_liked, min_collected, min_comments, max_age_days,
+                                       published_after, published_before)
+    except ValueError as e:
+        return f"Error: {e}"
+    fields = output_fields(fields, comment_limit)
+
+    groups: dict[str, MultiPost] = {}
+    missing = []
+    for search in dict.fromkeys(searches):
+        multi = result_cache.get((search, limit, sort, note_type, comment_limit, post_filter.key()))
+        if multi is not None:
+            groups[search] = multi
+        else:
+            missing.append(search)
+    if missing:
+        try:
+            async with admitted('fetch_xhs_hot_posts_batch'):
+                with span('batch', keywords=len(missing), limit=limit):
+                    batch = await batch_posts(missing, limit, sort, note_type, post_filter)
+                comment_dict = {}
+                if comment_limit:
+                    # 多个关键词下重复的帖子只获取一次评论
+                    all_items = {v['id']: v['xsec_token'] for items, _ in batch.values() for v in items}
+                    with span('comments_all', posts=len(all_items)):
+                        comment_dict = await fetch_posts_comments(all_items, comment_limit)
+                for search, (items, detail_dict) in batch.items():
+                    multi = MultiPost(items, detail_dict, comment_dict)
+                    if multi.posts:
+                        result_cache.put((search, limit, sort, note_type, comment_limit, post_filter.key()), multi)
+                    groups[search] = multi
+        except Overloaded as e:
+            return f'Error: {e}'
+    print(f'批量调用完成：{len(groups)}个关键词，缓存命中{len(groups) - len(missing)}个')
+
+    searches = list(dict.fromkeys(searches))
+    return fit_max_chars(lambda budget: render_batch(groups, searches, output_format, fields,
+                                                     budget // len(searches) if budget else 0), max_chars)
+
+
+def render_batch(groups: dict[str, MultiPost], searches: list[str], output_format: str, fields: tuple,
+                 budget: int) -> str:
+    """:param budget: 每个关键词的字符额度"""
+    if output_format != 'markdown':
+        records = {s: groups[s].to_records(fields, groups[s].desc_limits(output_format, fields, budget))
+                   for s in searches}
+        if output_format == 'json':
+            return json.dumps(records, ensure_ascii=False, separators=(',', ':'))
+        return ''.join(json.dumps({'keyword': s, **r}, ensure_ascii=False, separators=(',', ':')) + '\n'
+                       for s in searches for r in records[s])
+    return ''.join(f"\n==================== 关键词：{s} ====================\n"
+                   f"{groups[s].render('markdown', fields, budget) or '无数据\n'}"
+                   for s in searches)
+
+
+@mcp.tool()
+async def watch_xhs_keyword(search: str, limit: int = 20, sort: str = 'popularity_descending', note_type: int = 2,
+                            output_format: str = 'markdown', fields: list[str] = None, max_chars: int = 0) -> str:
+    """
+    增量监控 小红书 关键词：与上一次调用（相同参数）的结果对比，只返回变化的部分，只为新出现的帖子获取详情。
+    适合定时轮询同一批关键词，首次调用时所有帖子都作为新帖子返回
+    :param search: 搜索主题，长度不超过15个字
+    :param limit: 监控的帖子数量，不超过50
+    :param sort: 排序方式：general-综合 popularity_descending-最热 time_descending-最新
+    :param note_type: 帖子类型：0-全部 1-视频 2-图文
+    :param output_format: 输出格式：markdown、json（按变化类型分组的json对象）、ndjson（每行一项变化，带change字段）
+    :param fields: 新帖子与更新帖子输出的字段，为空则输出默认字段，可选字段同 fetch_xhs_hot_post
+    :param max_chars: 新帖子与更新帖子正文的字符数上限，0表示不限制
+    :return: 新帖子、内容有更新的帖子、互动数变化（旧值→新值）与掉出结果的帖子
+    """
+    if len(search) > 15:
+        return "Error: 搜索字符串长度不能超过15个字"
+    if not 1 <= limit <= 50:
+        return "Error: 监控帖子数量需在1~50之间"
+    msg = check_output_args(output_format, fields)
+    if msg:
+        return msg
+    try:
+        async with admitted('watch_xhs_keyword'):
+            with span('watch', keyword=search, limit=limit):
+                delta = await watch_posts(search, limit, sort, note_type)
+    except Overloaded as e:
+        return f'Error: {e}'
+    return delta.render(output_format, output_fields(fields, 0), max_chars)
+
+
+@mcp.custom_route('/metrics', methods=['GET'])
+async def metrics_route(request: Request) -> PlainTextResponse:
+    """Prometheus 指标，与SSE传输共用端口"""
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@mcp.custom_route('/ready', methods=['GET'])
+async def ready_route(request: Request) -> JSONResponse:
+    """就绪状态：至少一个工作单元已启动并登录时返回200，否则503；未启用后台守护时按登录探测判断"""
+    if os.getenv('XHS_KEEPER', '1') == '1':
+        status = get_keeper().status()
+    else:
+        status = await get_keeper().probe_status()
+    return JSONResponse(status, status_code=200 if status['ready'] else 503)
+
+
+def install_executor() -> ThreadPoolExecutor:
+    """
+    浏览器操作都通过to_thread在默认线程池中执行，默认大小（CPU数+4）在标签页较多时不够用，
+    按全部标签页数量加上余量（本地存储、缓存持久化等）替换为专用线程池
+    """
+    size = sum(w.pool.size for w in get_dispatcher().workers) + int(os.getenv('XHS_EXTRA_THREADS', 8))
+    executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='xhs')
+    asyncio.get_running_loop().set_default_executor(executor)
+    return executor
+
+
+async def purge_store(interval: float):
+    """定时删除本地存储中过期的记录，避免长时间运行后数据库无限增长"""
+    while True:
+        try:
+            n = await asyncio.to_thread(get_store().purge)
+            if n:
+                print(f'本地存储已删除{n}条过期记录')
+        except Exception as e:
+            print(f'清理本地存储异常：{e}')
+        await asyncio.sleep(interval)
+
+
+async def serve():
+    """与SSE服务一同启动后台会话守护（首个调用之前就完成浏览器启动与登录）与浏览器内存治理"""
+    install_executor()
+    keeper = get_keeper()
+    if os.getenv('XHS_KEEPER', '1') == '1':
+        keeper.start()
+    governor = get_governor()
+    governor.start()
+    purger = asyncio.create_task(purge_store(float(os.getenv('XHS_PURGE_INTERVAL', 3600))))
+    try:
+        await mcp.run_sse_async()
+    finally:
+        purger.cancel()
+        await asyncio.gather(purger, return_exceptions=True)
+        await governor.stop()
+        await keeper.stop()
+        await get_dispatcher().close()
+        await get_notifier().close()
+        await asyncio.to_thread(result_cache.flush)
+
+
 def main():
-    mcp.run(transport='sse')
+    asyncio.run(serve())
 
 
 if __name__ == '__main__':
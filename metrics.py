@@ -0,0 +1,146 @@
+import json
+import logging
+import threading
+import time
+import typing
+from contextlib import contextmanager
+
+logger = logging.getLogger('xhs.span')
+
+# 阶段耗时的分桶（秒）：从接口请求的几十毫秒到扫码等待的几十秒
+STAGE_BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels_text(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            lines += [f'{self.name}{_labels_text(k)} {v:g}' for k, v in self._values.items()]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple = STAGE_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, list] = {}  # labels -> [各分桶计数..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            v = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, v in self._values.items():
+                for i, b in enumerate(self.buckets):
+                    lines.append(f'{self.name}_bucket{_labels_text(key + (("le", f"{b:g}"),))} {v[i]}')
+                lines.append(f'{self.name}_bucket{_labels_text(key + (("le", "+Inf"),))} {v[-1]}')
+                lines.append(f'{self.name}_sum{_labels_text(key)} {v[-2]:g}')
+                lines.append(f'{self.name}_count{_labels_text(key)} {v[-1]}')
+        return lines
+
+
+class Gauge:
+    """取值时才计算的指标，fn 返回 [(labels dict, value), ...]"""
+
+    def __init__(self, name: str, help_text: str, fn: typing.Callable[[], list[tuple[dict, float]]]):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f'采集指标{self.name}异常: {e}')
+            values = []
+        lines += [f'{self.name}{_labels_text(tuple(sorted(k.items())))} {v:g}' for k, v in values]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = STAGE_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def gauge(self, name: str, help_text: str, fn: typing.Callable[[], list[tuple[dict, float]]]) -> Gauge:
+        self._metrics[name] = Gauge(name, help_text, fn)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines = []
+        for m in self._metrics.values():
+            lines += m.render()
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram('xhs_stage_duration_seconds', '各阶段耗时')
+stage_errors = registry.counter('xhs_stage_errors_total', '各阶段抛出异常的次数')
+detail_seconds = registry.histogram('xhs_detail_duration_seconds', '单个帖子详情的获取耗时')
+retries = registry.counter('xhs_retries_total', '重试次数')
+safe_checks = registry.counter('xhs_safe_check_total', '触发安全验证的次数')
+cache_requests = registry.counter('xhs_cache_requests_total', '缓存查询次数，result为hit或miss')
+detail_api = registry.counter('xhs_detail_api_total', '通过feed接口获取详情的帖子数，result为ok、fallback（回退到详情页）或rejected（访问频次异常）')
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    记录一个阶段的耗时：写入阶段耗时直方图，并输出一行结构化日志（附带关键词、帖子id等属性）。
+    块内可通过 yield 的 dict 补充属性。
+    """
+    extra = dict(attrs)
+    start = time.perf_counter()
+    error = ''
+    try:
+        yield extra
+    except BaseException as e:
+        error = type(e).__name__
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stage_seconds.observe(duration, stage=stage)
+        record = {'stage': stage, 'duration_ms': round(duration * 1000, 1), **extra}
+        if error:
+            record['error'] = error
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
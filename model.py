@@ -1,5 +1,34 @@
-import asyncio
 import json
+import typing
+from datetime import datetime
+
+# 可输出的字段及其在markdown中的标签，顺序即输出顺序
+FIELD_LABELS = {
+    'title': '标题',
+    'desc': '内容',
+    'note_id': '帖子id',
+    'url': 'URL',
+    'publish_time': '发布日期',
+    'last_update_time': '更新时间',
+    'ip_location': 'IP属地',
+    'publish_user_name': '发布者',
+    'publish_user_id': '发布者id',
+    'ptype': '发布类型',
+    'liked_count': '点赞数',
+    'collected_count': '收藏数',
+    'comment_count': '评论数',
+    'shared_count': '分享数',
+    'tags': '标签',
+    'cover_url': '封面图片',
+    'video_url': '视频地址',
+    'images': '图片',
+    'comments': '评论',
+}
+DEFAULT_FIELDS = ('title', 'desc', 'note_id', 'publish_time', 'publish_user_name', 'ptype', 'liked_count',
+                  'collected_count', 'comment_count', 'shared_count', 'tags')
+OUTPUT_FORMATS = ('markdown', 'json', 'ndjson')
+COUNT_FIELDS = ('liked_count', 'collected_count', 'comment_count', 'shared_count')
+TRUNCATED = '…'
 
 
 class DetailPageInfo:
@@ -10,6 +39,22 @@ class DetailPageInfo:
         self.is_video = self.video_url != ''
         self.desc = kwargs.get('desc')
         self.tags = kwargs.get('tags')
+        self.error = kwargs.get('error', '')  # 获取失败的原因，为空表示成功
+        # 以下字段仅在从页面状态读取时存在
+        self.images = kwargs.get('images', [])
+        self.liked_count = kwargs.get('liked_count')
+        self.collected_count = kwargs.get('collected_count')
+        self.comment_count = kwargs.get('comment_count')
+        self.shared_count = kwargs.get('shared_count')
+        # 以下字段仅在从页面状态或feed接口读取时存在，时间为毫秒时间戳
+        self.ip_location = kwargs.get('ip_location', '')
+        self.publish_ts = kwargs.get('publish_ts')
+        self.update_ts = kwargs.get('update_ts')
+
+
+def format_ts(ts: int | None) -> str:
+    """毫秒时间戳转为 2023-01-01 12:00，为空时返回空字符串"""
+    return datetime.fromtimestamp(ts / 1000).strftime('%Y-%m-%d %H:%M') if ts else ''
 
 
 class Comment:
@@ -18,13 +63,18 @@ class Comment:
         self.content = kwargs.get('content')
         self.liked_count = kwargs.get('liked_count')
 
+    def to_markdown(self) -> str:
+        return f"- {self.user_name}（赞{self.liked_count}）：{self.content}\n"
+
 
 class Post:
     note_id: str = ""
     title: str = ""
     desc: str = ""
     url: str = ""
-    publish_time: str = ""  # 2023-01-01
+    publish_time: str = ""  # 2023-01-01 12:00，没有精确时间时为搜索结果中的文本，如 3天前
+    last_update_time: str = ""
+    ip_location: str = ""
     publish_user_name: str = ""
     publish_user_id: str = ""
     ptype: str = ""  # image+text video+text
@@ -36,22 +86,24 @@ class Post:
     video_url: str = ""
     images: list[str] = []
     tags: list[str] = []
-    comments: list[Comment] = []  # todo
-
-    # ip_location: str = ''
+    comments: list[Comment] = []
 
     def __init__(self, detail: DetailPageInfo, **kwargs):
         self.note_id = kwargs.get('note_id')
         self.title = kwargs.get('title')
-        self.publish_time = kwargs.get('publish_time')
+        self.publish_time = format_ts(detail.publish_ts) or kwargs.get('publish_time')
+        self.last_update_time = format_ts(detail.update_ts)
+        self.ip_location = detail.ip_location or kwargs.get('ip_location', '')
         self.publish_user_name = kwargs.get('publish_user_name')
+        self.publish_user_id = kwargs.get('publish_user_id')
         self.ptype = kwargs.get('ptype')
         self.liked_count = kwargs.get('liked_count')
         self.collected_count = kwargs.get('collected_count')
         self.comment_count = kwargs.get('comment_count')
         self.shared_count = kwargs.get('shared_count')
         self.cover_url = kwargs.get('cover_url')
-        self.images = kwargs.get('images', [])
+        self.images = detail.images or kwargs.get('images', [])
+        self.comments = kwargs.get('comments') or []
 
         # detail页面信息
         self.desc = detail.desc
@@ -59,37 +111,41 @@ class Post:
         self.video_url = detail.video_url
         self.url = detail.url
 
-    def json(self):
-        return json.dumps(self.__dict__)
-
-    async def to_markdown(self) -> str:
-        markdown_str = f"**标题** {self.title}\n"
-        markdown_str += f"**内容**:{self.desc}\n"
-        # markdown_str += f"**URL**:{self.url}\n"
-        markdown_str += f"**帖子id**: {self.note_id}\n"
-        markdown_str += f"**发布日期**: {self.publish_time}\n"
-        markdown_str += f"**发布者**: {self.publish_user_name}\n"
-        markdown_str += f"**发布类型**: {self.ptype}\n"
-        markdown_str += f"**点赞数**: {self.liked_count}\n"
-        markdown_str += f"**收藏数**: {self.collected_count}\n"
-        markdown_str += f"**评论数**: {self.comment_count}\n"
-        markdown_str += f"**分享数**: {self.shared_count}\n"
-        markdown_str += f"**标签**: {self.tags}\n"
-        # markdown_str += f"**封面图片**: {self.cover_url}\n"
-        # markdown_str += f"**IP 地址**: {self.ip_location}\n"
-
-        # if self.images:
-        #     markdown_str += f"**图片**:\n"
-        #     for img in self.images:
-        #         markdown_str += f"- {img}\n"
-        # print(markdown_str)
-        return markdown_str
+    def to_dict(self, fields: tuple = DEFAULT_FIELDS, desc_limit: int | None = None) -> dict:
+        """
+        :param fields: 输出的字段，见 FIELD_LABELS
+        :param desc_limit: 正文的最大字符数，None表示不截断
+        """
+        d = {f: getattr(self, f, None) for f in fields}
+        if 'comments' in d:
+            d['comments'] = [c.__dict__ for c in self.comments]
+        if 'desc' in d and desc_limit is not None and d['desc'] and len(d['desc']) > desc_limit:
+            d['desc'] = d['desc'][:desc_limit] + TRUNCATED
+        return d
+
+    def json(self, fields: tuple = DEFAULT_FIELDS, desc_limit: int | None = None) -> str:
+        """紧凑的单行json"""
+        return json.dumps(self.to_dict(fields, desc_limit), ensure_ascii=False, separators=(',', ':'))
+
+    def to_markdown(self, fields: tuple = DEFAULT_FIELDS, desc_limit: int | None = None) -> str:
+        d = self.to_dict(tuple(f for f in fields if f != 'comments'), desc_limit)
+        parts = [f"**{FIELD_LABELS[k]}**: {v}\n" for k, v in d.items()]
+        if 'comments' in fields and self.comments:
+            parts.append(f"**{FIELD_LABELS['comments']}**:\n")
+            parts += [c.to_markdown() for c in self.comments]
+        return ''.join(parts)
 
 
 class MultiPost:
     posts: list[Post]
 
-    def __init__(self, items: dict, detail_dict: dict):
+    def __init__(self, items: dict, detail_dict: dict, comment_dict: dict | None = None):
+        """
+        :param items: search/notes 接口返回的items
+        :param detail_dict: {note_id: DetailPageInfo}
+        :param comment_dict: {note_id: [Comment]}，可选
+        """
+        comment_dict = comment_dict or {}
         self.posts = []
         for item in items:
             note_id = item.get('id')
@@ -125,6 +181,7 @@ class MultiPost:
                 shared_count=shared_count,
                 publish_user_name=publisher,
                 publish_user_id=publisher_uid,
+                comments=comment_dict.get(note_id),
             ))
 
     def parse_pubtime(self, item: dict):
@@ -151,12 +208,150 @@ class MultiPost:
         else:
             return typ
 
-    async def to_markdown(self) -> str:
-        output = ''
-        for i, post in enumerate(self.posts):
-            output += f"\n############ 第 {i + 1} 篇帖子 ############\n\n"
-            output += await post.to_markdown()
-        return output
+    def to_markdown(self, fields: tuple = DEFAULT_FIELDS, desc_limits: list | None = None) -> str:
+        limits = desc_limits or [None] * len(self.posts)
+        return ''.join(f"\n############ 第 {i + 1} 篇帖子 ############\n\n{post.to_markdown(fields, limit)}"
+                       for i, (post, limit) in enumerate(zip(self.posts, limits)))
+
+    def to_records(self, fields: tuple = DEFAULT_FIELDS, desc_limits: list | None = None) -> list[dict]:
+        limits = desc_limits or [None] * len(self.posts)
+        return [post.to_dict(fields, limit) for post, limit in zip(self.posts, limits)]
+
+    def _render(self, fmt: str, fields: tuple, desc_limits: list | None) -> str:
+        if fmt == 'json':
+            return json.dumps(self.to_records(fields, desc_limits), ensure_ascii=False, separators=(',', ':'))
+        if fmt == 'ndjson':
+            limits = desc_limits or [None] * len(self.posts)
+            return ''.join(post.json(fields, limit) + '\n' for post, limit in zip(self.posts, limits))
+        return self.to_markdown(fields, desc_limits)
+
+    def desc_limits(self, fmt: str, fields: tuple, max_chars: int) -> list[int] | None:
+        """
+        输出超出max_chars时各篇正文可保留的字符数，未超出返回None
+        正文全部截断为0时的长度即固定开销（已含截断标记），剩余额度再公平地分给各篇正文
+        """
+        if not max_chars or 'desc' not in fields or len(self._render(fmt, fields, None)) <= max_chars:
+            return None
+        overhead = len(self._render(fmt, fields, [0] * len(self.posts)))
+        return fair_share([len(p.desc or '') for p in self.posts], max_chars - overhead)
+
+    def render(self, fmt: str = 'markdown', fields: tuple = DEFAULT_FIELDS, max_chars: int = 0) -> str:
+        """
+        :param fmt: markdown、json（紧凑的json数组）或 ndjson（每行一篇帖子）
+        :param fields: 输出的字段，见 FIELD_LABELS
+        :param max_chars: 输出的字符数上限，超出时在帖子之间公平地截断正文，0表示不限制，见 fit_max_chars
+        """
+        return fit_max_chars(lambda budget: self._render(fmt, fields, self.desc_limits(fmt, fields, budget)),
+                             max_chars)
+
+
+class WatchDelta:
+    """关键词监控两次轮询之间的变化：新出现的帖子、内容有更新的帖子、互动数的变化与掉出结果的帖子"""
+
+    def __init__(self, new: MultiPost, updated: MultiPost, counts: list[dict], removed: list[str]):
+        """
+        :param new: 新出现的帖子（含详情）
+        :param updated: 标题或详情有变化的帖子（含重新获取的详情）
+        :param counts: 互动数有变化的帖子，[{note_id, title, 变化的字段: [旧值, 新值]}]
+        :param removed: 掉出结果的帖子id
+        """
+        self.new = new
+        self.updated = updated
+        self.counts = counts
+        self.removed = removed
+
+    @property
+    def empty(self) -> bool:
+        return not (self.new.posts or self.updated.posts or self.counts or self.removed)
+
+    def _limits(self, fmt: str, fields: tuple, max_chars: int) -> tuple:
+        """按帖子数量把字符额度分给新帖子与更新的帖子"""
+        total = len(self.new.posts) + len(self.updated.posts)
+        if not max_chars or not total:
+            return None, None
+        budget = max_chars * len(self.new.posts) // total
+        return (self.new.desc_limits(fmt, fields, budget),
+                self.updated.desc_limits(fmt, fields, max_chars - budget))
+
+    def to_markdown(self, fields: tuple = DEFAULT_FIELDS, max_chars: int = 0) -> str:
+        if self.empty:
+            return '无变化\n'
+        new_limits, updated_limits = self._limits('markdown', fields, max_chars)
+        parts = []
+        if self.new.posts:
+            parts.append(f"\n==================== 新帖子（{len(self.new.posts)}） ====================\n"
+                         f"{self.new.to_markdown(fields, new_limits)}")
+        if self.updated.posts:
+            parts.append(f"\n==================== 内容有更新（{len(self.updated.posts)}） ====================\n"
+                         f"{self.updated.to_markdown(fields, updated_limits)}")
+        if self.counts:
+            parts.append(f"\n==================== 互动数变化（{len(self.counts)}） ====================\n")
+            for c in self.counts:
+                changes = '，'.join(f"{FIELD_LABELS[f]} {c[f][0]}→{c[f][1]}" for f in COUNT_FIELDS if f in c)
+                parts.append(f"- {c['title']}（{c['note_id']}）：{changes}\n")
+        if self.removed:
+            parts.append(f"\n==================== 掉出结果（{len(self.removed)}） ====================\n")
+            parts += [f"- {note_id}\n" for note_id in self.removed]
+        return ''.join(parts)
+
+    def to_dict(self, fields: tuple = DEFAULT_FIELDS, max_chars: int = 0, fmt: str = 'json') -> dict:
+        new_limits, updated_limits = self._limits(fmt, fields, max_chars)
+        return {
+            'new': self.new.to_records(fields, new_limits),
+            'updated': self.updated.to_records(fields, updated_limits),
+            'counts': self.counts,
+            'removed': self.removed,
+        }
+
+    def render(self, fmt: str = 'markdown', fields: tuple = DEFAULT_FIELDS, max_chars: int = 0) -> str:
+        """
+        :param fmt: markdown、json（按变化类型分组的json对象）或 ndjson（每行一项变化，带change字段）
+        :param max_chars: 输出的字符数上限，见 fit_max_chars
+        """
+        return fit_max_chars(lambda budget: self._render(fmt, fields, budget), max_chars)
+
+    def _render(self, fmt: str, fields: tuple, max_chars: int) -> str:
+        if fmt == 'markdown':
+            return self.to_markdown(fields, max_chars)
+        d = self.to_dict(fields, max_chars, fmt)
+        if fmt == 'json':
+            return json.dumps(d, ensure_ascii=False, separators=(',', ':'))
+        lines = [{'change': 'new', **r} for r in d['new']] + [{'change': 'updated', **r} for r in d['updated']]
+        lines += [{'change': 'counts', **c} for c in d['counts']]
+        lines += [{'change': 'removed', 'note_id': n} for n in d['removed']]
+        return ''.join(json.dumps(v, ensure_ascii=False, separators=(',', ':')) + '\n' for v in lines)
+
+
+def fit_max_chars(render: typing.Callable[[int], str], max_chars: int, rounds: int = 10) -> str:
+    """
+    按正文额度渲染，并保证结果不超过max_chars：额度的估算不含json转义、评论与分组标题等，
+    渲染后仍超出时按超出的字符数缩减额度重新渲染。正文全部截断后仍超出（其余字段本身就超出上限）时返回最短的结果
+    :param render: 以正文额度（字符数）渲染输出
+    :param rounds: 最多重新渲染的次数
+    """
+    out = render(max_chars)
+    budget = max_chars
+    for _ in range(rounds):
+        if not max_chars or len(out) <= max_chars or budget <= 1:
+            break
+        budget = max(budget - (len(out) - max_chars), 1)
+        out = render(budget)
+    return out
+
+
+def fair_share(lengths: list[int], budget: int) -> list[int]:
+    """
+    按最大最小公平原则分配额度：短的全部保留，剩余额度由较长的平分
+    :return: 每一项可保留的长度
+    """
+    budget = max(budget, 0)
+    shares = [0] * len(lengths)
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for n, i in enumerate(order):
+        cap = budget // (len(order) - n)
+        shares[i] = min(lengths[i], cap)
+        budget -= shares[i]
+    return shares
 
 
 if __name__ == '__main__':
@@ -179,4 +374,4 @@ if __name__ == '__main__':
         ip_location="北京"
     )
 
-    asyncio.run(p.to_markdown())
+    print(p.to_markdown())
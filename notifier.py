@@ -0,0 +1,139 @@
+import asyncio
+import collections
+import os
+import time
+
+import httpx
+
+from metrics import registry
+from util import dingtalk_signed_url, dingtalk_markdown_payload
+
+notifications = registry.counter('xhs_dingtalk_messages_total', '钉钉消息数量，result为sent、failed、dropped或coalesced')
+
+
+class DingTalkNotifier:
+    """
+    后台发送钉钉消息：调用方只把消息放入队列，由后台任务通过连接池发送。
+    短时间内相同标题的通知（如多个标签页同时触发验证）合并为一条；遵守机器人每分钟的发送上限。
+    """
+
+    def __init__(self, webhook: str, secret: str, per_minute: int = 20, coalesce_window: float = 2,
+                 max_queue: int = 100):
+        """
+        :param per_minute: 每分钟最多发送的消息数（钉钉机器人限制为20条）
+        :param coalesce_window: 收到一条通知后等待合并同类通知的时间（秒）
+        :param max_queue: 队列上限，满了以后新的通知直接丢弃
+        """
+        self.webhook = webhook
+        self.secret = secret
+        self.per_minute = per_minute
+        self.coalesce_window = coalesce_window
+        self._queue: asyncio.Queue | None = None
+        self._max_queue = max_queue
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+        self._sent_at: collections.deque[float] = collections.deque()
+
+    def _ensure_started(self):
+        # 队列、连接池与后台任务都需要在事件循环中创建
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(self._max_queue)
+            self._client = httpx.AsyncClient(timeout=5)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def notify(self, title: str, text: str, pic_urls: list[str] = None):
+        """发送通知且不等待结果，队列已满时丢弃"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((title, text, pic_urls or [], None))
+        except asyncio.QueueFull:
+            notifications.inc(result='dropped')
+            print(f'钉钉消息队列已满，丢弃：{title}')
+
+    async def send(self, title: str, text: str, pic_urls: list[str] = None) -> dict:
+        """发送消息并等待钉钉的返回（不参与合并），用于扫码登录等需要确认送达的场景"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((title, text, pic_urls or [], future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            if batch[0][3] is None:
+                # 等待一小段时间，收集同一波的通知
+                await asyncio.sleep(self.coalesce_window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for title, text, pic_urls, future in self._coalesce(batch):
+                try:
+                    resp = await self._post(title, text, pic_urls)
+                except Exception as e:
+                    print(f'发送钉钉消息异常：{title} {e}')
+                    resp = {'errcode': -1, 'errmsg': str(e)}
+                if future is not None and not future.done():
+                    future.set_result(resp)
+
+    @staticmethod
+    def _coalesce(batch: list[tuple]) -> list[tuple]:
+        """需要返回结果的消息单独发送，其余按标题合并"""
+        ret = []
+        groups: dict[str, list[tuple]] = {}
+        for msg in batch:
+            if msg[3] is not None:
+                ret.append(msg)
+            else:
+                groups.setdefault(msg[0], []).append(msg)
+        for title, msgs in groups.items():
+            if len(msgs) == 1:
+                ret.append(msgs[0])
+                continue
+            notifications.inc(len(msgs) - 1, result='coalesced')
+            text = '\n\n---\n\n'.join(m[1] for m in msgs)
+            pic_urls = [u for m in msgs for u in m[2]]
+            ret.append((f'{title}（{len(msgs)}条）', text, pic_urls, None))
+        return ret
+
+    async def _wait_rate_limit(self):
+        now = time.monotonic()
+        while self._sent_at and now - self._sent_at[0] >= 60:
+            self._sent_at.popleft()
+        if len(self._sent_at) >= self.per_minute:
+            delay = 60 - (now - self._sent_at[0])
+            print(f'钉钉消息达到每分钟上限，等待{delay:.1f}s')
+            await asyncio.sleep(delay)
+            self._sent_at.popleft()
+        self._sent_at.append(time.monotonic())
+
+    async def _post(self, title: str, text: str, pic_urls: list[str]) -> dict:
+        await self._wait_rate_limit()
+        try:
+            resp = await self._client.post(dingtalk_signed_url(self.webhook, self.secret),
+                                           json=dingtalk_markdown_payload(title, text, pic_urls))
+            body = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            print(f'发送钉钉消息异常：{title} {e}')
+            body = {'errcode': -1, 'errmsg': str(e)}
+        notifications.inc(result='sent' if body.get('errcode') == 0 else 'failed')
+        if body.get('errcode') != 0:
+            print(f'发送钉钉消息失败：{title} {body}')
+        return body
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+
+
+_notifier: DingTalkNotifier | None = None
+
+
+def get_notifier() -> DingTalkNotifier:
+    global _notifier
+    if _notifier is None:
+        _notifier = DingTalkNotifier(webhook=os.getenv('DINGTALK_WEBHOOK_URI', ''),
+                                     secret=os.getenv('DINGTALK_SECRET', ''),
+                                     per_minute=int(os.getenv('DINGTALK_PER_MINUTE', 20)),
+                                     coalesce_window=float(os.getenv('DINGTALK_COALESCE_WINDOW', 2)))
+    return _notifier
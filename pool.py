@@ -0,0 +1,264 @@
+import asyncio
+import sys
+import time
+from contextlib import asynccontextmanager
+
+from DrissionPage import ChromiumOptions, WebPage
+from DrissionPage.items import MixTab
+
+from blocker import get_blocker
+from metrics import span
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/137.0.0.0 Safari/537.36')
+
+
+def get_os_type():
+    if sys.platform.startswith("darwin"):
+        return "macOS"
+    elif sys.platform.startswith("linux"):
+        return "Linux"
+    else:
+        return "Windows"
+
+
+def new_browser(user_data_path: str = '', port: int = 0) -> WebPage:
+    """
+    :param user_data_path: 浏览器用户目录，不同目录对应不同的登录账号
+    :param port: 浏览器调试端口，多个浏览器同时运行时需各不相同
+    """
+    ostyp = get_os_type()
+    print('ostyp:', ostyp)
+    # ostyp = 'Linux'
+    co = ChromiumOptions()
+    if user_data_path:
+        co.set_user_data_path(user_data_path)
+    if port:
+        co.set_local_port(port)
+    if ostyp == 'Linux':
+        co = (co.headless().set_argument('--disable-blink-features', 'AutomationControlled'))
+        co.set_argument('--no-sandbox')
+        co.set_argument('--disable-infobars')
+        co.set_argument('--enable-automation')
+    co.set_user_agent(USER_AGENT)
+    page = WebPage(chromium_options=co)
+    page.set.user_agent(USER_AGENT)
+    return page
+
+
+class BrowserPool:
+    """
+    进程级浏览器与标签页池：持有一个浏览器实例和若干预热好的标签页（load_mode.none + UA），
+    按需借出/归还，归还时做健康检查，崩溃或卡死的标签页会被关闭并补充新的。
+    记录页面导航次数与浏览器内存，可整体重启浏览器以释放长时间运行积累的内存。
+    """
+
+    def __init__(self, size: int = 6, warm: int = 3, max_lease: float = 60, user_data_path: str = '', port: int = 0):
+        """
+        :param size: 池中标签页的数量上限，超出的借用请求需等待归还
+        :param warm: 启动时预热的标签页数量，其余按需创建
+        :param max_lease: 单次借出的最长时间（秒），超过视为卡死，归还时回收
+        :param user_data_path: 浏览器用户目录，见 new_browser
+        :param port: 浏览器调试端口，见 new_browser
+        """
+        self.size = size
+        self.user_data_path = user_data_path
+        self.port = port
+        self.warm = min(warm, size)
+        self.max_lease = max_lease
+        self._browser: WebPage | None = None
+        self._idle: asyncio.Queue[MixTab] = asyncio.Queue()
+        self._leased: dict[str, float] = {}  # tab_id -> 借出时间
+        self._lock = asyncio.Lock()
+        self._open = asyncio.Event()  # 重启浏览器期间关闭，新的借用请求等待
+        self._open.set()
+        self._created = 0
+        self._recycled = 0
+        self._navigations = 0  # 本次启动以来的页面导航次数
+        self._restarts = 0
+
+    @property
+    def browser(self) -> WebPage:
+        if self._browser is None:
+            with span('browser_launch', profile=self.user_data_path or 'default'):
+                self._browser = new_browser(self.user_data_path, self.port)
+        return self._browser
+
+    @property
+    def started(self) -> bool:
+        """浏览器是否已启动；browser属性会按需启动浏览器，只查看状态时用这个"""
+        return self._browser is not None
+
+    def cookies(self) -> list[dict]:
+        """已启动的浏览器中全部域名的cookie（含过期时间），未启动时返回空列表；阻塞调用，需在线程中执行"""
+        browser = self._browser
+        if browser is None:
+            return []
+        return browser.cookies(all_domains=True, all_info=True)
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size,
+            'total': self._idle.qsize() + len(self._leased),
+            'idle': self._idle.qsize(),
+            'leased': len(self._leased),
+            'created': self._created,
+            'recycled': self._recycled,
+            'navigations': self._navigations,
+            'restarts': self._restarts,
+            'blocked': get_blocker().stats(),
+        }
+
+    def rss_bytes(self) -> int:
+        """浏览器进程（含子进程）的RSS之和，未安装psutil或浏览器未启动时返回0"""
+        if self._browser is None:
+            return 0
+        try:
+            import psutil
+        except ImportError:
+            return 0
+        try:
+            proc = psutil.Process(self._browser.process_id)
+            return sum(p.memory_info().rss for p in [proc, *proc.children(recursive=True)])
+        except (psutil.Error, TypeError):
+            return 0
+
+    async def navigate(self, tab: MixTab, url: str):
+        """在线程中打开页面，并计入导航次数（达到上限后由调用方重启浏览器）"""
+        self._navigations += 1
+        await asyncio.to_thread(tab.get, url)
+
+    async def start(self):
+        """启动浏览器并预热标签页，可重复调用"""
+        async with self._lock:
+            await asyncio.to_thread(lambda: self.browser)
+            while self._idle.qsize() + len(self._leased) < self.warm:
+                await self._idle.put(await self._new_tab())
+
+    async def _new_tab(self) -> MixTab:
+        def core():
+            t = self.browser.new_tab()
+            t.set.load_mode.none()
+            t.set.user_agent(USER_AGENT)
+            get_blocker().attach(t)
+            return t
+
+        tab = await asyncio.to_thread(core)
+        self._created += 1
+        return tab
+
+    @staticmethod
+    def _is_healthy(tab: MixTab) -> bool:
+        try:
+            return tab.states.is_alive
+        except Exception:
+            return False
+
+    async def _recycle(self, tab: MixTab, replace: bool = True):
+        """关闭标签页，replace为True时补充一个新的"""
+        self._recycled += 1
+        get_blocker().detach(tab.tab_id)
+        try:
+            await asyncio.to_thread(tab.close)
+        except Exception as e:
+            print(f'关闭标签页异常: {e}')
+        if not replace:
+            return
+        try:
+            await self._idle.put(await self._new_tab())
+        except Exception as e:
+            print(f'补充标签页异常: {e}')
+
+    async def acquire(self) -> MixTab:
+        await self._open.wait()
+        if self._idle.empty():
+            async with self._lock:
+                # 没有空闲标签页且未达上限时直接新建一个
+                if self._idle.empty() and self._idle.qsize() + len(self._leased) < self.size:
+                    tab = await self._new_tab()
+                    self._leased[tab.tab_id] = time.monotonic()
+                    return tab
+        while True:
+            tab = await self._idle.get()
+            if not self._open.is_set():
+                # 排队期间开始了重启（取到的可能是重启中预热的标签页），放回并等待重启完成
+                self._idle.put_nowait(tab)
+                await self._open.wait()
+                continue
+            # 健康检查期间即计为借出，使重启等待它归还
+            self._leased[tab.tab_id] = time.monotonic()
+            if await asyncio.to_thread(self._is_healthy, tab):
+                return tab
+            self._leased.pop(tab.tab_id, None)
+            await self._recycle(tab, replace=self._open.is_set())
+
+    async def release(self, tab: MixTab, healthy: bool = True):
+        """
+        归还标签页
+        :param healthy: 调用方在使用中遇到异常时传False，标签页会被回收重建
+        """
+        leased_at = self._leased.pop(tab.tab_id, None)
+        if leased_at is None:
+            # 浏览器强制重启前借出的标签页，所属浏览器已退出，直接丢弃
+            get_blocker().detach(tab.tab_id)
+            return
+        if not self._open.is_set():
+            # 重启浏览器期间归还的标签页直接关闭，不再放回池中被借出
+            await self._recycle(tab, replace=False)
+            return
+        stuck = time.monotonic() - leased_at > self.max_lease
+        if healthy and not stuck and await asyncio.to_thread(self._is_healthy, tab):
+            await self._idle.put(tab)
+        else:
+            await self._recycle(tab)
+
+    @asynccontextmanager
+    async def tab(self):
+        """借出一个标签页，退出时自动归还；块内抛出异常则回收该标签页"""
+        tab = await self.acquire()
+        healthy = False
+        try:
+            yield tab
+            healthy = True
+        finally:
+            await self.release(tab, healthy)
+
+    async def close(self):
+        """关闭池内所有空闲标签页（借出中的在归还时处理）"""
+        while not self._idle.empty():
+            t = self._idle.get_nowait()
+            get_blocker().detach(t.tab_id)
+            try:
+                await asyncio.to_thread(t.close)
+            except Exception as e:
+                print(f'关闭标签页异常: {e}')
+
+    async def restart(self, drain_timeout: float | None = None):
+        """
+        重启浏览器以释放长时间运行积累的内存：暂停借出，等待借出中的标签页归还，
+        关闭全部标签页并退出浏览器，然后重新启动并预热
+        :param drain_timeout: 等待归还的最长时间（秒），默认为max_lease，超时后强制重启
+        """
+        if not self._open.is_set():
+            return
+        self._open.clear()
+        try:
+            deadline = time.monotonic() + (self.max_lease if drain_timeout is None else drain_timeout)
+            while self._leased and time.monotonic() < deadline:
+                await asyncio.sleep(.5)
+            if self._leased:
+                print(f'{len(self._leased)}个标签页未归还，强制重启浏览器')
+            await self.close()
+            async with self._lock:
+                browser, self._browser = self._browser, None
+                self._leased.clear()
+                if browser is not None:
+                    try:
+                        await asyncio.to_thread(browser.quit)
+                    except Exception as e:
+                        print(f'退出浏览器异常: {e}')
+            self._navigations = 0
+            self._restarts += 1
+            await self.start()
+        finally:
+            self._open.set()
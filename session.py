@@ -0,0 +1,129 @@
+import random
+import time
+
+import httpx
+
+from pool import USER_AGENT
+from util import api_origin, web_origin
+
+NOTES_PATH = '/api/sns/web/v1/search/notes'
+USER_ME_PATH = '/api/sns/web/v2/user/me'
+
+
+def new_search_id() -> str:
+    """生成与网页端格式一致的search_id（时间戳左移64位加随机数，base36编码）"""
+    n = (int(time.time() * 1000) << 64) + random.randint(0, 2147483646)
+    alphabet = '0123456789abcdefghijklmnopqrstuvwxyz'
+    s = ''
+    while n:
+        n, i = divmod(n, 36)
+        s = alphabet[i] + s
+    return s
+
+
+class SearchSession:
+    """
+    搜索会话模板：从浏览器中捕获一次 search/notes 请求的headers、cookies与postData，
+    之后的关键词直接通过连接池请求接口，无需再打开搜索页。
+    接口拒绝请求（非200或code!=0）时模板失效，调用方应回退到浏览器流程重新捕获。
+    """
+
+    def __init__(self, timeout: float = 5):
+        self.headers: dict = {}
+        self.cookies: dict = {}
+        self.post_data: dict = {}
+        self.captured_at = 0.0
+        self.client = httpx.AsyncClient(timeout=timeout,
+                                         limits=httpx.Limits(max_keepalive_connections=10, max_connections=20))
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.headers and self.post_data)
+
+    def capture(self, headers: dict, cookies: dict, post_data: dict):
+        headers = {k: v for k, v in headers.items() if k.lower() not in ('content-length', 'cookie')}
+        self.headers = headers
+        self.cookies = dict(cookies)
+        self.post_data = dict(post_data)
+        self.captured_at = time.time()
+
+    def update_cookies(self, cookies: dict):
+        """浏览器中的cookie刷新后同步到模板，保留模板的headers与postData"""
+        self.cookies.update(cookies)
+
+    def invalidate(self):
+        self.headers, self.cookies, self.post_data = {}, {}, {}
+        self.captured_at = 0.0
+
+    async def search(self, keyword: str, sort: str = 'popularity_descending', note_type: int = 2,
+                     page: int = 1) -> dict | None:
+        """
+        直接请求 search/notes 接口
+        :return: 接口返回的json，被拒绝时返回None（模板同时失效）
+        """
+        if not self.ready:
+            return None
+        data = dict(self.post_data, keyword=keyword, sort=sort, note_type=note_type, page=page)
+        if keyword != self.post_data.get('keyword'):
+            data['search_id'] = new_search_id()
+        try:
+            resp = await self.client.post(api_origin() + NOTES_PATH, headers=self.headers, cookies=self.cookies,
+                                           json=data)
+        except httpx.HTTPError as e:
+            print(f'直连search/notes异常: {e}')
+            return None
+        if resp.status_code != 200:
+            print(f'直连search/notes被拒绝: {resp.status_code}')
+            self.invalidate()
+            return None
+        body = resp.json()
+        if not isinstance(body, dict) or body.get('code') != 0:
+            print(f'直连search/notes被拒绝: {body}')
+            self.invalidate()
+            return None
+        return body
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class LoginProbe:
+    """
+    低成本的登录状态探测：没有web_session cookie直接判定未登录，
+    否则请求 user/me 接口看是否为游客；结果缓存ttl秒，避免每次搜索都探测。
+    """
+
+    def __init__(self, client: httpx.AsyncClient, ttl: float = 60):
+        self.ttl = ttl
+        self._client = client
+        self._state: bool | None = None
+        self._checked_at = 0.0
+
+    def mark(self, logged_in: bool):
+        """由页面流程得到的确切状态"""
+        self._state = logged_in
+        self._checked_at = time.time()
+
+    def invalidate(self):
+        self._state = None
+
+    async def check(self, cookies: dict) -> bool:
+        if self._state is not None and time.time() - self._checked_at < self.ttl:
+            return self._state
+        if not cookies.get('web_session'):
+            self.mark(False)
+            return False
+        try:
+            resp = await self._client.get(api_origin() + USER_ME_PATH, cookies=cookies, headers={
+                'user-agent': USER_AGENT,
+                'origin': web_origin(),
+                'referer': web_origin() + '/',
+            })
+            body = resp.json() if resp.status_code == 200 else {}
+        except (httpx.HTTPError, ValueError) as e:
+            print(f'探测登录状态异常: {e}')
+            return False
+        data = body.get('data') or {}
+        logged_in = bool(body.get('success')) and data.get('guest') is False
+        self.mark(logged_in)
+        return logged_in
@@ -0,0 +1,123 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from model import DetailPageInfo, Comment
+
+
+class DetailStore:
+    """
+    详情页信息与评论的本地存储（SQLite），以note_id为键。
+    在有效期内的记录直接复用，不再打开详情页或请求评论接口。另存关键词监控的快照。
+    """
+
+    def __init__(self, path: str = 'xhs.db', ttl: float = 86400, comment_ttl: float = 3600,
+                 watch_ttl: float = 30 * 86400):
+        """
+        :param path: 数据库文件路径
+        :param ttl: 详情记录的有效期（秒），<=0 表示不复用
+        :param comment_ttl: 评论记录的有效期（秒），<=0 表示不复用
+        :param watch_ttl: 关键词监控快照在多久没有轮询后删除（秒），<=0 表示不删除
+        """
+        self.ttl = ttl
+        self.comment_ttl = comment_ttl
+        self.watch_ttl = watch_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS detail ('
+                           'note_id TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL)')
+        # has_more=0 表示已取到该帖子的全部评论
+        self._conn.execute('CREATE TABLE IF NOT EXISTS comment ('
+                           'note_id TEXT PRIMARY KEY, data TEXT NOT NULL, has_more INTEGER NOT NULL, '
+                           'fetched_at REAL NOT NULL)')
+        # 关键词监控的快照，key为监控参数的json
+        self._conn.execute('CREATE TABLE IF NOT EXISTS watch ('
+                           'key TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)')
+        self._conn.commit()
+
+    def get_many(self, note_ids: list[str]) -> dict[str, DetailPageInfo]:
+        """返回仍在有效期内的记录"""
+        if not note_ids or self.ttl <= 0:
+            return {}
+        placeholders = ','.join('?' * len(note_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT note_id, data FROM detail WHERE note_id IN ({placeholders}) AND fetched_at >= ?',
+                [*note_ids, time.time() - self.ttl]).fetchall()
+        return {note_id: DetailPageInfo(**json.loads(data)) for note_id, data in rows}
+
+    def put_many(self, infos: list[DetailPageInfo]):
+        """保存详情，未成功获取（无note_id或有error）的记录会被忽略"""
+        now = time.time()
+        rows = [(v.note_id, json.dumps(v.__dict__, ensure_ascii=False), now) for v in infos
+                if v.note_id and not v.error]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO detail (note_id, data, fetched_at) VALUES (?, ?, ?)', rows)
+            self._conn.commit()
+
+    def get_comments(self, note_ids: list[str], limit: int) -> dict[str, list[Comment]]:
+        """返回仍在有效期内、且足够limit条（或已是全部评论）的记录，截取前limit条"""
+        if not note_ids or self.comment_ttl <= 0:
+            return {}
+        placeholders = ','.join('?' * len(note_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT note_id, data, has_more FROM comment WHERE note_id IN ({placeholders}) AND fetched_at >= ?',
+                [*note_ids, time.time() - self.comment_ttl]).fetchall()
+        ret = {}
+        for note_id, data, has_more in rows:
+            comments = json.loads(data)
+            if len(comments) >= limit or not has_more:
+                ret[note_id] = [Comment(**c) for c in comments[:limit]]
+        return ret
+
+    def put_comments(self, note_id: str, comments: list[Comment], has_more: bool):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO comment (note_id, data, has_more, fetched_at) '
+                               'VALUES (?, ?, ?, ?)',
+                               [note_id, json.dumps([c.__dict__ for c in comments], ensure_ascii=False),
+                                int(has_more), time.time()])
+            self._conn.commit()
+
+    def get_snapshot(self, key: str) -> dict | None:
+        """关键词监控的上一次快照（不过期），没有时返回None"""
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM watch WHERE key = ?', [key]).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_snapshot(self, key: str, snapshot: dict):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO watch (key, data, updated_at) VALUES (?, ?, ?)',
+                               [key, json.dumps(snapshot, ensure_ascii=False), time.time()])
+            self._conn.commit()
+
+    def purge(self) -> int:
+        """
+        删除已过期的详情与评论，以及长时间没有轮询的监控快照
+        :return: 删除的记录数
+        """
+        now = time.time()
+        with self._lock:
+            n = self._conn.execute('DELETE FROM detail WHERE fetched_at < ?', [now - self.ttl]).rowcount
+            n += self._conn.execute('DELETE FROM comment WHERE fetched_at < ?', [now - self.comment_ttl]).rowcount
+            if self.watch_ttl > 0:
+                n += self._conn.execute('DELETE FROM watch WHERE updated_at < ?', [now - self.watch_ttl]).rowcount
+            self._conn.commit()
+        return n
+
+
+_store: DetailStore | None = None
+
+
+def get_store() -> DetailStore:
+    global _store
+    if _store is None:
+        _store = DetailStore(path=os.getenv('XHS_DETAIL_DB', 'xhs.db'),
+                             ttl=float(os.getenv('XHS_DETAIL_TTL', 86400)),
+                             comment_ttl=float(os.getenv('XHS_COMMENT_TTL', 3600)),
+                             watch_ttl=float(os.getenv('XHS_WATCH_TTL', 30 * 86400)))
+    return _store
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import time
+import unittest
+
+from cache import ResultCache
+from metrics import cache_requests
+from model import MultiPost
+
+
+class ResultCacheFlushTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'cache.pkl')
+
+    def test_put_does_not_save_synchronously(self):
+        cache = ResultCache(path=self.path, flush_interval=60)
+        cache.put(('a',), MultiPost([], {}))
+        cache.put(('b',), MultiPost([], {}))
+        self.assertFalse(os.path.exists(self.path))
+        cache.flush()
+        self.assertEqual(ResultCache(path=self.path).stats()['entries'], 2)
+
+    def test_writes_are_merged_into_one_delayed_save(self):
+        cache = ResultCache(path=self.path, flush_interval=.05)
+        for i in range(10):
+            cache.put((i,), MultiPost([], {}))
+        time.sleep(.3)
+        self.assertIsNone(cache._timer)  # noqa
+        self.assertEqual(ResultCache(path=self.path).stats()['entries'], 10)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+
+class ResultCacheTest(unittest.TestCase):
+    def test_stats_and_metrics(self):
+        cache = ResultCache()
+        hits = cache_requests.value(cache='result', result='hit')
+        misses = cache_requests.value(cache='result', result='miss')
+        self.assertIsNone(cache.get(('a',)))
+        cache.put(('a',), MultiPost([], {}))
+        self.assertIsNotNone(cache.get(('a',)))
+        self.assertEqual(cache_requests.value(cache='result', result='hit'), hits + 1)
+        self.assertEqual(cache_requests.value(cache='result', result='miss'), misses + 1)
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertGreater(stats['bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import time
+import unittest
+
+from concurrency import CircuitBreaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def half_open_breaker(self) -> CircuitBreaker:
+        breaker = CircuitBreaker(threshold=1, window=60, reset_timeout=10, probe_timeout=60)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        breaker.opened_at = time.monotonic() - 11  # 跳过reset_timeout
+        self.assertEqual(breaker.state, 'half_open')
+        return breaker
+
+    def test_open_rejects_search_and_detail(self):
+        breaker = CircuitBreaker(threshold=1)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow(probe=False))
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_search_then_detail_closes(self):
+        breaker = self.half_open_breaker()
+        # 同一调用中先搜索，搜索不占用试探名额
+        self.assertTrue(breaker.allow(probe=False))
+        # 随后的第一个详情作为试探请求放行，其余等待试探结果
+        self.assertTrue(breaker.allow())
+        self.assertEqual([breaker.allow() for _ in range(3)], [False, False, False])
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertTrue(breaker.allow())
+
+    def test_half_open_failed_probe_reopens(self):
+        breaker = self.half_open_breaker()
+        self.assertTrue(breaker.allow(probe=False))
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow(probe=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from datetime import date
+
+from filters import PostFilter, parse_count, parse_publish_date
+
+TODAY = date(2024, 3, 10)
+
+
+class ParseCountTest(unittest.TestCase):
+    def test_plain_and_suffixes(self):
+        cases = {'123': 123, 123: 123, '10+': 10, '1.2万': 12000, '3万': 30000, '1.2w': 12000, '2W': 20000,
+                 '1.5亿': 150000000, ' 7 ': 7}
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(parse_count(value), expected)
+
+    def test_bad_input_is_zero(self):
+        for value in (None, '', '赞', 'abc万', '--'):
+            with self.subTest(value=value):
+                self.assertEqual(parse_count(value), 0)
+
+
+class ParsePublishDateTest(unittest.TestCase):
+    def test_relative(self):
+        cases = {'刚刚': TODAY, '5分钟前': TODAY, '3小时前': TODAY, '3天前': date(2024, 3, 7),
+                 '昨天 12:30': date(2024, 3, 9), '前天 08:00': date(2024, 3, 8), '编辑于 2天前': date(2024, 3, 8)}
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_publish_date(text, TODAY), expected)
+
+    def test_absolute(self):
+        self.assertEqual(parse_publish_date('2023-06-15', TODAY), date(2023, 6, 15))
+        self.assertEqual(parse_publish_date('03-01', TODAY), date(2024, 3, 1))
+        # 晚于今天的月-日只能是去年的
+        self.assertEqual(parse_publish_date('06-15', TODAY), date(2023, 6, 15))
+
+    def test_bad_input_is_none(self):
+        for text in (None, '', '很久以前', '13-45', '2023-02-30'):
+            with self.subTest(text=text):
+                self.assertIsNone(parse_publish_date(text, TODAY))
+
+
+class PostFilterTest(unittest.TestCase):
+    @staticmethod
+    def item(liked: str, note_type: str = 'normal') -> dict:
+        return {'note_card': {'type': note_type, 'interact_info': {'liked_count': liked}}}
+
+    def test_match_counts_and_type(self):
+        f = PostFilter.parse(note_type=2, min_liked=10000)
+        self.assertTrue(f.match(self.item('1.2w')))
+        self.assertFalse(f.match(self.item('9999')))
+        self.assertFalse(f.match(self.item('2万', 'video')))
+
+    def test_parse_rejects_bad_args(self):
+        for kwargs in ({'min_liked': -1}, {'published_after': '2024/01/01'},
+                       {'published_after': '2024-02-01', 'published_before': '2024-01-01'}):
+            with self.subTest(kwargs=kwargs):
+                with self.assertRaises(ValueError):
+                    PostFilter.parse(**kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
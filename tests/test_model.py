@@ -0,0 +1,52 @@
+import unittest
+
+from model import MultiPost, DetailPageInfo, Comment, WatchDelta, DEFAULT_FIELDS
+
+
+def item(i: int) -> dict:
+    return {'id': f'n{i}', 'xsec_token': 't', 'model_type': 'note', 'note_card': {
+        'display_title': f'标题{i}', 'type': 'normal', 'user': {'nickname': '作者', 'user_id': f'U{i}'}, 'interact_info': {},
+        'corner_tag_info': [{'type': 'publish_time', 'text': '1天前'}]}}
+
+
+def multi_post(n: int = 5) -> MultiPost:
+    items = [item(i) for i in range(n)]
+    # 换行与引号在json中需要转义，按原文长度估算的额度会偏小
+    details = {v['id']: DetailPageInfo(note_id=v['id'], desc='第一行\n"引号"\\' * (50 + i * 20))
+               for i, v in enumerate(items)}
+    comments = {v['id']: [Comment(user_name='网友', content='评论' * 30, liked_count=1)] for v in items}
+    return MultiPost(items, details, comments)
+
+
+class MultiPostTest(unittest.TestCase):
+    def test_publish_user(self):
+        record = multi_post(1).to_records(('publish_user_name', 'publish_user_id'))[0]
+        self.assertEqual(record, {'publish_user_name': '作者', 'publish_user_id': 'U0'})
+
+
+class MaxCharsTest(unittest.TestCase):
+    fields = DEFAULT_FIELDS + ('comments',)
+
+    def test_render_fits_max_chars(self):
+        multi = multi_post()
+        for fmt in ('markdown', 'json', 'ndjson'):
+            full = len(multi.render(fmt, self.fields))
+            for max_chars in (full // 2, full // 4):
+                with self.subTest(fmt=fmt, max_chars=max_chars):
+                    self.assertLessEqual(len(multi.render(fmt, self.fields, max_chars)), max_chars)
+
+    def test_untruncated_output_is_unchanged(self):
+        multi = multi_post()
+        full = multi.render('json', self.fields)
+        self.assertEqual(multi.render('json', self.fields, len(full)), full)
+
+    def test_watch_delta_fits_max_chars(self):
+        delta = WatchDelta(multi_post(3), multi_post(2), [], ['n9'])
+        for fmt in ('markdown', 'json', 'ndjson'):
+            full = len(delta.render(fmt, self.fields))
+            with self.subTest(fmt=fmt):
+                self.assertLessEqual(len(delta.render(fmt, self.fields, full // 2)), full // 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+import types
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+try:
+    import blocker
+    import logic
+    import store
+    import workers
+    from concurrency import AdaptiveLimiter, TokenBucket
+    from model import DetailPageInfo
+    from pool import BrowserPool
+except ImportError as e:  # 未安装DrissionPage等依赖时跳过
+    raise unittest.SkipTest(f'缺少依赖：{e.name}')
+
+PAGE_DELAY = .3
+_ids = itertools.count()
+
+
+class FakeTab:
+    """替身标签页：打开页面时阻塞PAGE_DELAY秒（与真实的 tab.get 一样在线程中执行）"""
+
+    def __init__(self):
+        self.tab_id = f'tab{next(_ids)}'
+        self.title = ''
+        self.url = ''
+        self.set = types.SimpleNamespace(load_mode=types.SimpleNamespace(none=lambda: None),
+                                         user_agent=lambda ua: None)
+        self.states = types.SimpleNamespace(is_alive=True)
+
+    def get(self, url: str):
+        time.sleep(PAGE_DELAY)
+        self.url = url
+
+    def close(self):
+        self.states.is_alive = False
+
+
+class FakeBrowser:
+    def new_tab(self) -> FakeTab:
+        return FakeTab()
+
+    def quit(self):
+        pass
+
+
+class FakePool(BrowserPool):
+    @property
+    def browser(self):
+        if self._browser is None:
+            self._browser = FakeBrowser()
+        return self._browser
+
+
+async def fake_extract(tab, note_id: str, url: str) -> DetailPageInfo:
+    return DetailPageInfo(note_id=note_id, url=url, desc=f'正文{note_id}')
+
+
+class ConcurrentDetailTest(unittest.IsolatedAsyncioTestCase):
+    """多个并发调用共享标签页池，总耗时应接近单次调用而不是被串行化"""
+    calls = 4
+    notes_per_call = 2
+
+    async def asyncSetUp(self):
+        size = self.calls * self.notes_per_call
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=size + 4))
+        worker = workers.BrowserWorker('test')
+        worker.pool = FakePool(size=size, warm=1)
+        worker.limiter = AdaptiveLimiter(initial=size, max_limit=size)
+        worker.bucket = TokenBucket(rate=0)
+        patches = {
+            (workers, '_dispatcher'): workers.Dispatcher([worker]),
+            (store, '_store'): store.DetailStore(path=os.path.join(tempfile.mkdtemp(), 'test.db')),
+            (blocker, '_blocker'): blocker.ResourceBlocker([], []),
+            (logic, '_feed_source'): logic.FeedDetailSource(enabled=False),
+            (logic, 'extract_from_state'): fake_extract,
+        }
+        for (module, name), value in patches.items():
+            patcher = mock.patch.object(module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.seq = 0
+
+    async def call(self) -> dict:
+        self.seq += 1
+        return await logic.fetch_posts_detail({f'note{self.seq}-{i}': 'token' for i in range(self.notes_per_call)})
+
+    async def test_concurrent_calls_overlap(self):
+        await self.call()  # 预热标签页
+        start = time.monotonic()
+        self.assertEqual(len(await self.call()), self.notes_per_call)
+        single = time.monotonic() - start
+
+        start = time.monotonic()
+        results = await asyncio.gather(*[self.call() for _ in range(self.calls)])
+        wall = time.monotonic() - start
+
+        self.assertTrue(all(len(r) == self.notes_per_call for r in results))
+        # 串行时约为 calls 倍
+        self.assertLess(wall, single * 2, f'单次{single:.2f}s，{self.calls}个并发{wall:.2f}s')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import tempfile
+import time
+import unittest
+
+from model import DetailPageInfo, Comment
+from store import DetailStore
+
+
+class DetailStorePurgeTest(unittest.TestCase):
+    def setUp(self):
+        self.store = DetailStore(path=os.path.join(tempfile.mkdtemp(), 'test.db'), ttl=60, comment_ttl=60,
+                                 watch_ttl=60)
+
+    def age(self, table: str, column: str, seconds: float):
+        self.store._conn.execute(f'UPDATE {table} SET {column} = ?', [time.time() - seconds])  # noqa
+        self.store._conn.commit()  # noqa
+
+    def test_purge_removes_expired_records_only(self):
+        self.store.put_many([DetailPageInfo(note_id='old', desc='旧')])
+        self.store.put_comments('old', [Comment(user_name='a', content='b', liked_count=1)], False)
+        self.store.put_snapshot('old', {'old': {}})
+        self.age('detail', 'fetched_at', 120)
+        self.age('comment', 'fetched_at', 120)
+        self.age('watch', 'updated_at', 120)
+        self.store.put_many([DetailPageInfo(note_id='new', desc='新')])
+        self.store.put_snapshot('new', {'new': {}})
+
+        self.assertEqual(self.store.purge(), 3)
+        self.assertEqual(list(self.store.get_many(['old', 'new'])), ['new'])
+        self.assertEqual(self.store.get_comments(['old'], 1), {})
+        self.assertIsNone(self.store.get_snapshot('old'))
+        self.assertEqual(self.store.get_snapshot('new'), {'new': {}})
+        self.assertEqual(self.store.purge(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import store
+    import watch
+    from model import DetailPageInfo
+except ImportError as e:  # 未安装DrissionPage等依赖时跳过
+    raise unittest.SkipTest(f'缺少依赖：{e.name}')
+
+
+def item(note_id: str, title: str = '', liked: int = 0) -> dict:
+    return {'id': note_id, 'xsec_token': 'token', 'model_type': 'note', 'note_card': {
+        'display_title': title or f'标题{note_id}', 'type': 'normal', 'user': {},
+        'interact_info': {'liked_count': liked}, 'corner_tag_info': [{'type': 'publish_time', 'text': '1天前'}]}}
+
+
+class WatchPostsTest(unittest.IsolatedAsyncioTestCase):
+    """替换搜索与详情获取，快照保存在临时的SQLite存储中"""
+
+    async def asyncSetUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'test.db')
+        self.items: list[dict] = []
+        self.failing: set[str] = set()
+        self.fetched: list[str] = []
+        self.use_store(store.DetailStore(path=self.path))
+        for name, fn in (('iter_valid_items', self.iter_valid_items), ('fetch_posts_detail', self.fetch_details)):
+            patcher = mock.patch.object(watch, name, fn)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def use_store(self, detail_store: store.DetailStore):
+        patcher = mock.patch.object(store, '_store', detail_store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def iter_valid_items(self, *args):
+        for v in self.items:
+            yield v
+
+    async def fetch_details(self, items: dict, refresh: bool = False) -> dict[str, DetailPageInfo]:
+        self.fetched += items
+        return {n: DetailPageInfo(note_id=n, desc=f'正文{n}') for n in items if n not in self.failing}
+
+    async def poll(self) -> watch.WatchDelta:
+        self.fetched = []
+        return await watch.watch_posts('关键词', 10)
+
+    @staticmethod
+    def ids(multi) -> list[str]:
+        return [p.note_id for p in multi.posts]
+
+    async def test_first_poll_reports_all_as_new(self):
+        self.items = [item('a'), item('b')]
+        delta = await self.poll()
+        self.assertEqual(self.ids(delta.new), ['a', 'b'])
+        self.assertEqual(self.fetched, ['a', 'b'])
+
+    async def test_second_poll_reports_only_changes(self):
+        self.items = [item('a'), item('b', liked=1)]
+        await self.poll()
+        self.items = [item('b', liked=5), item('c')]
+        delta = await self.poll()
+        self.assertEqual(self.ids(delta.new), ['c'])
+        self.assertEqual(self.fetched, ['c'])  # 已见过的帖子不再获取详情
+        self.assertEqual(delta.counts, [{'note_id': 'b', 'title': '标题b', 'liked_count': [1, 5]}])
+        self.assertEqual(delta.removed, ['a'])
+
+    async def test_retitled_post_is_updated(self):
+        self.items = [item('a')]
+        await self.poll()
+        self.items = [item('a', title='新标题')]
+        delta = await self.poll()
+        self.assertEqual(self.ids(delta.new), [])
+        self.assertEqual(self.ids(delta.updated), ['a'])
+
+    async def test_failed_detail_is_reported_once(self):
+        self.items = [item('a')]
+        self.failing = {'a'}
+        self.assertEqual(self.ids((await self.poll()).new), ['a'])
+        delta = await self.poll()
+        self.assertEqual(self.fetched, ['a'])  # 补取详情
+        self.assertTrue(delta.empty)
+        self.failing = set()
+        self.assertTrue((await self.poll()).empty)  # 补取成功也不再作为新帖子返回
+        self.assertEqual(self.fetched, ['a'])
+        self.assertTrue((await self.poll()).empty)
+        self.assertEqual(self.fetched, [])  # 已取到详情，不再获取
+
+    async def test_snapshot_persists_across_store_instances(self):
+        self.items = [item('a')]
+        await self.poll()
+        # 模拟服务重启：重新打开同一个数据库文件
+        self.use_store(store.DetailStore(path=self.path))
+        self.items = [item('a'), item('b')]
+        delta = await self.poll()
+        self.assertEqual(self.ids(delta.new), ['b'])
+        self.assertEqual(self.fetched, ['b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
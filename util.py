@@ -1,8 +1,8 @@
+import asyncio
 import base64
 import hashlib
 import hmac
 import json
-import logging
 import os
 import time
 import typing
@@ -10,26 +10,24 @@ import urllib.parse
 from datetime import datetime
 
 import requests
-from tenacity import before_log, RetryCallState
 
 # env defined
 ENV_DINGTALK_WEBHOOK_URI = ''
 ENV_DINGTALK_SECRET = ''
 
 
-def readable_time():
-    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+def web_origin() -> str:
+    """网站地址，可通过环境变量XHS_WEB_ORIGIN指向本地替身站点（离线基准测试使用）"""
+    return os.getenv('XHS_WEB_ORIGIN', 'https://www.xiaohongshu.com').rstrip('/')
+
 
+def api_origin() -> str:
+    """接口地址，可通过环境变量XHS_API_ORIGIN指向本地替身站点（离线基准测试使用）"""
+    return os.getenv('XHS_API_ORIGIN', 'https://edith.xiaohongshu.com').rstrip('/')
 
-def tool_hook_before(logger: "logging.Logger", log_level: int, func_list: list[typing.Callable]) -> (
-        typing.Callable)[
-    ["RetryCallState"], None]:
-    def core(retry_state: "RetryCallState") -> None:
-        before_log(logger, log_level)(retry_state)
-        for i in func_list:
-            i()
 
-    return core
+def readable_time():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
 
 def load_env():
@@ -45,19 +43,31 @@ def load_env():
             raise ValueError("请设置环境变量DINGTALK_WEBHOOK_URI")
 
 
-def send_dingtalk_message(message):
-    webhook = ENV_DINGTALK_WEBHOOK_URI
-    secret = ENV_DINGTALK_SECRET
-    # 构造时间戳和签名
+def dingtalk_signed_url(webhook: str, secret: str) -> str:
+    """钉钉机器人加签：在webhook后附加时间戳与签名"""
     timestamp = str(round(time.time() * 1000))
-    secret_enc = secret.encode('utf-8')
     string_to_sign = f'{timestamp}\n{secret}'
-    string_to_sign_enc = string_to_sign.encode('utf-8')
-    hmac_code = hmac.new(secret_enc, string_to_sign_enc, digestmod=hashlib.sha256).digest()
+    hmac_code = hmac.new(secret.encode('utf-8'), string_to_sign.encode('utf-8'), digestmod=hashlib.sha256).digest()
     sign = urllib.parse.quote_plus(base64.b64encode(hmac_code))
+    return f'{webhook}&timestamp={timestamp}&sign={sign}'
+
 
+def dingtalk_markdown_payload(title: str, text: str, pic_urls: list[str] = None) -> dict:
+    """钉钉图文消息（Markdown格式）的消息体，图片放在文本之前"""
+    images_markdown = '\n'.join([f"![screenshot]({url})" for url in pic_urls or []])  # 多图Markdown格式
+    return {
+        "msgtype": "markdown",
+        "markdown": {
+            "title": title,
+            "text": f"{'\n\n'.join([images_markdown + '\n', text])}"  # 将多图与文本结合
+        }
+    }
+
+
+def send_dingtalk_message(message):
+    """同步发送钉钉文本消息，服务运行中请使用 notifier.get_notifier()"""
     # 构造请求URL
-    url = f'{webhook}&timestamp={timestamp}&sign={sign}'
+    url = dingtalk_signed_url(ENV_DINGTALK_WEBHOOK_URI, ENV_DINGTALK_SECRET)
 
     # 构造消息体
     headers = {'Content-Type': 'application/json'}
@@ -72,47 +82,26 @@ def send_dingtalk_message(message):
     }
 
     # 发送请求
-    response = requests.post(url, data=json.dumps(data), headers=headers)
+    response = requests.post(url, data=json.dumps(data), headers=headers, timeout=5)
     return response.json()
 
 
 def send_dingtalk_markdown(title, text, pic_urls: [] = None):
     """
-    发送钉钉图文通知（Markdown格式）
+    同步发送钉钉图文通知（Markdown格式），服务运行中请使用 notifier.get_notifier()
     :param pic_urls:
-    :param webhook: 钉钉机器人Webhook地址
-    :param secret: 钉钉机器人加签密钥
     :param title: 文章标题
     :param text: 文章内容（Markdown格式）
     """
-    if pic_urls is None:
-        pic_urls = []
-    webhook = ENV_DINGTALK_WEBHOOK_URI
-    secret = ENV_DINGTALK_SECRET
-    # 当前时间戳
-    timestamp = str(round(time.time() * 1000))
-    # 拼接字符串
-    string_to_sign = f'{timestamp}\n{secret}'
-    # 生成签名
-    hmac_code = hmac.new(secret.encode('utf-8'), string_to_sign.encode('utf-8'), digestmod=hashlib.sha256).digest()
-    sign = urllib.parse.quote_plus(base64.b64encode(hmac_code))
-
     # 构造请求URL
-    request_url = f'{webhook}&timestamp={timestamp}&sign={sign}'
+    request_url = dingtalk_signed_url(ENV_DINGTALK_WEBHOOK_URI, ENV_DINGTALK_SECRET)
 
     # 构造消息体
     headers = {'Content-Type': 'application/json'}
-    images_markdown = '\n'.join([f"![screenshot]({url})" for url in pic_urls])  # 多图Markdown格式
-    data = {
-        "msgtype": "markdown",
-        "markdown": {
-            "title": title,
-            "text": f"{'\n\n'.join([images_markdown + '\n', text])}"  # 将多图与文本结合
-        }
-    }
+    data = dingtalk_markdown_payload(title, text, pic_urls)
 
     # 发送请求
-    response = requests.post(request_url, data=json.dumps(data), headers=headers)
+    response = requests.post(request_url, data=json.dumps(data), headers=headers, timeout=5)
     return response.json()
 
 
@@ -141,6 +130,25 @@ def countdown(hint, seconds, fn: typing.Callable[[], bool]) -> bool:
     return False
 
 
+async def async_countdown(hint, seconds, fn: typing.Callable[[], bool]) -> bool:
+    """
+    countdown 的异步版本：等待期间不占用事件循环，fn 在线程中执行
+    :param fn: 条件检查函数（可能阻塞）
+    :param seconds: 倒计时的秒数
+    """
+    import sys
+    while seconds >= 0:
+        sys.stdout.write(f"\r{hint}: {seconds} 秒")
+        sys.stdout.flush()
+
+        await asyncio.sleep(1)
+        if await asyncio.to_thread(fn):  # condition is ok
+            return True
+        seconds -= 1
+    print('\n')
+    return False
+
+
 if __name__ == '__main__':
     load_env()
     # send_dingtalk_message(ENV_DINGTALK_WEBHOOK_URI, ENV_DINGTALK_SECRET, "大家好，我是练习两年半的肖战")
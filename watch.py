@@ -0,0 +1,102 @@
+import hashlib
+import json
+from asyncio import to_thread
+
+from concurrency import SingleFlight
+from logic import iter_valid_items, fetch_posts_detail
+from metrics import span, registry
+from model import DetailPageInfo, MultiPost, WatchDelta, COUNT_FIELDS
+from store import get_store
+
+# 同一关键词的并发轮询只执行一次，避免两次轮询交错读写快照
+watch_flight = SingleFlight()
+
+watch_notes = registry.counter('xhs_watch_notes_total', '关键词监控中各类变化的帖子数，change为new、updated、counts或removed')
+
+
+def watch_key(search: str, limit: int, sort: str, note_type: int) -> str:
+    return json.dumps([search, limit, sort, note_type], ensure_ascii=False)
+
+
+def detail_hash(info: DetailPageInfo) -> str:
+    """详情中可能被作者编辑的内容的摘要"""
+    raw = json.dumps([info.desc, info.tags, info.video_url, info.images], ensure_ascii=False)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def item_entry(item: dict, info: DetailPageInfo | None) -> dict:
+    """快照中记录的一条帖子：标题、互动数与详情摘要（详情获取失败时标记为pending）"""
+    card = item.get('note_card', {})
+    interact = card.get('interact_info', {})
+    entry = {'title': card.get('display_title'), **{f: interact.get(f, 0) for f in COUNT_FIELDS}}
+    if info is not None:
+        entry['hash'] = detail_hash(info)
+    else:
+        entry['pending'] = True
+    return entry
+
+
+async def watch_posts(search: str, limit: int, sort: str = 'popularity_descending', note_type: int = 2) \
+        -> WatchDelta:
+    """
+    增量监控关键词：与上一次的快照对比，只为新出现或标题有变化的帖子获取详情，
+    其余帖子只比较搜索结果中的互动数与本地存储中的详情摘要。首次监控时全部帖子都是新帖子。
+    每个帖子只在首次出现时作为新帖子返回一次，当时详情获取失败的帖子在之后的轮询中静默补取详情。
+    """
+    key = watch_key(search, limit, sort, note_type)
+    return await watch_flight.do(key, lambda: watch_posts_core(key, search, limit, sort, note_type))
+
+
+async def watch_posts_core(key: str, search: str, limit: int, sort: str, note_type: int) -> WatchDelta:
+    store = get_store()
+    items = [item async for item in iter_valid_items(search, limit, sort, note_type)]
+    snapshot = await to_thread(store.get_snapshot, key) or {}
+
+    new_items, pending, retitled, kept, counts = [], [], [], [], []
+    for item in items:
+        old = snapshot.get(item['id'])
+        if old is None:
+            new_items.append(item)
+            continue
+        entry = item_entry(item, None)
+        changed = {f: [old.get(f), entry[f]] for f in COUNT_FIELDS if old.get(f) != entry[f]}
+        if changed:
+            counts.append({'note_id': item['id'], 'title': entry['title'], **changed})
+        if 'hash' not in old:
+            # 上次详情获取失败的帖子已作为新帖子返回过，只补取详情，不再返回
+            pending.append(item)
+            continue
+        (retitled if entry['title'] != old['title'] else kept).append(item)
+
+    with span('watch_details', keyword=search, new=len(new_items), pending=len(pending), retitled=len(retitled)):
+        details = await fetch_posts_detail({v['id']: v['xsec_token'] for v in new_items + pending})
+        # 标题变了的帖子正文也可能被编辑过，忽略本地存储重新获取
+        details.update(await fetch_posts_detail({v['id']: v['xsec_token'] for v in retitled}, refresh=True))
+    updated_items = list(retitled)
+    # 其余帖子不打开详情页，只对比本地存储中的详情（可能已被其他调用更新）与快照中的摘要
+    stored = await to_thread(store.get_many, [v['id'] for v in kept])
+    for item in kept:
+        info = stored.get(item['id'])
+        if info is not None and detail_hash(info) != snapshot[item['id']]['hash']:
+            details[item['id']] = info
+            updated_items.append(item)
+
+    new_snapshot = {}
+    for item in items:
+        entry = item_entry(item, details.get(item['id']))
+        old = snapshot.get(item['id'])
+        if 'hash' not in entry and old and 'hash' in old:
+            entry.pop('pending')
+            entry['hash'] = old['hash']
+        new_snapshot[item['id']] = entry
+    removed = [note_id for note_id in snapshot if note_id not in new_snapshot]
+    await to_thread(store.put_snapshot, key, new_snapshot)
+
+    delta = WatchDelta(MultiPost(new_items, details), MultiPost(updated_items, details), counts, removed)
+    for change, n in (('new', len(delta.new.posts)), ('updated', len(delta.updated.posts)),
+                      ('counts', len(counts)), ('removed', len(removed))):
+        watch_notes.inc(n, change=change)
+    print(f'监控【{search}】：新帖子{len(new_items)}个，内容更新{len(updated_items)}个，'
+          f'互动数变化{len(counts)}个，掉出结果{len(removed)}个，'
+          f'补取详情{sum("hash" in new_snapshot[v["id"]] for v in pending)}/{len(pending)}个')
+    return delta
@@ -0,0 +1,136 @@
+import os
+
+from blocker import get_blocker
+from concurrency import AdaptiveLimiter, TokenBucket, CircuitBreaker
+from metrics import registry
+from pool import BrowserPool
+from session import SearchSession, LoginProbe
+
+
+class BrowserWorker:
+    """
+    一个相互隔离的浏览器工作单元：独立的用户目录（即独立的登录账号）、独立的浏览器进程，
+    以及属于该账号的会话模板、登录探测、并发控制与限速。
+    """
+
+    def __init__(self, name: str, user_data_path: str = '', port: int = 0):
+        """
+        :param name: 名称，用于日志与通知
+        :param user_data_path: 浏览器用户目录，为空则使用默认目录
+        :param port: 浏览器调试端口，为0则使用默认端口
+        """
+        self.name = name
+        self.pool = BrowserPool(size=int(os.getenv('XHS_TAB_POOL_SIZE', 6)),
+                                warm=int(os.getenv('XHS_TAB_POOL_WARM', 3)),
+                                user_data_path=user_data_path, port=port)
+        self.session = SearchSession()
+        self.probe = LoginProbe(self.session.client)
+        self.limiter = AdaptiveLimiter(initial=int(os.getenv('XHS_DETAIL_CONCURRENCY', 3)),
+                                       max_limit=int(os.getenv('XHS_DETAIL_MAX_CONCURRENCY', 6)),
+                                       target_latency=float(os.getenv('XHS_DETAIL_TARGET_LATENCY', 5)),
+                                       cooldown=float(os.getenv('XHS_SAFE_CHECK_COOLDOWN', 300)))
+        self.bucket = TokenBucket(rate=float(os.getenv('XHS_PAGE_RATE', 1)),
+                                  burst=int(os.getenv('XHS_PAGE_BURST', 3)))
+
+    @property
+    def healthy(self) -> bool:
+        """触发安全验证后的冷却期内不再分配任务"""
+        return not self.limiter.paused
+
+    @property
+    def load(self) -> float:
+        return self.limiter.inflight / max(self.limiter.limit, 1) + self.pool.stats()['leased']
+
+    async def close(self):
+        """服务退出时关闭会话模板的http客户端与池内的空闲标签页（浏览器保持运行，下次启动直接连接）"""
+        await self.session.close()
+        await self.pool.close()
+
+
+class Dispatcher:
+    """
+    在健康的工作单元之间分配搜索与详情任务，选择负载最低者；
+    熔断器在所有工作单元之上统计安全验证，频繁触发时整体停止访问网站
+    """
+
+    def __init__(self, workers: list[BrowserWorker], breaker: CircuitBreaker | None = None):
+        self.workers = workers
+        self.breaker = breaker or CircuitBreaker()
+
+    @property
+    def session_ready(self) -> bool:
+        return any(w.session.ready for w in self.workers)
+
+    def pick(self, prefer_session: bool = False) -> BrowserWorker | None:
+        """
+        :param prefer_session: 优先选择已有会话模板的工作单元（搜索可直接请求接口）
+        :return: 没有健康的工作单元时返回None
+        """
+        healthy = [w for w in self.workers if w.healthy]
+        if not healthy:
+            return None
+        if prefer_session:
+            return min(healthy, key=lambda w: (not w.session.ready, w.load))
+        return min(healthy, key=lambda w: w.load)
+
+    async def close(self):
+        for worker in self.workers:
+            try:
+                await worker.close()
+            except Exception as e:
+                print(f'关闭{worker.name}异常：{e}')
+
+
+_dispatcher: Dispatcher | None = None
+
+
+def get_dispatcher() -> Dispatcher:
+    """
+    按环境变量创建工作单元：第1个默认使用浏览器的默认用户目录与端口（兼容单账号部署），
+    可用 XHS_WORKER0_PROFILE、XHS_WORKER0_PORT 指定；其余使用 XHS_PROFILE_DIR 下的独立目录与依次递增的端口
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        n = int(os.getenv('XHS_WORKERS', 1))
+        profile_dir = os.getenv('XHS_PROFILE_DIR', 'profiles')
+        base_port = int(os.getenv('XHS_BASE_PORT', 9222))
+        workers = [BrowserWorker('worker0', user_data_path=os.getenv('XHS_WORKER0_PROFILE', ''),
+                                 port=int(os.getenv('XHS_WORKER0_PORT') or 0))]
+        for i in range(1, n):
+            workers.append(BrowserWorker(f'worker{i}', user_data_path=os.path.join(profile_dir, f'worker{i}'),
+                                         port=base_port + i))
+        _dispatcher = Dispatcher(workers, CircuitBreaker(threshold=int(os.getenv('XHS_BREAKER_THRESHOLD', 3)),
+                                                         window=float(os.getenv('XHS_BREAKER_WINDOW', 300)),
+                                                         reset_timeout=float(os.getenv('XHS_BREAKER_RESET', 600))))
+    return _dispatcher
+
+
+def _worker_metrics(fn) -> list[tuple[dict, float]]:
+    # 尚未创建工作单元时不采集，避免为了取指标而启动浏览器
+    if _dispatcher is None:
+        return []
+    return [(labels, value) for w in _dispatcher.workers for labels, value in fn(w)]
+
+
+registry.gauge('xhs_tab_pool_tabs', '标签页池中的标签页数量，state为idle或leased', lambda: _worker_metrics(
+    lambda w: [({'worker': w.name, 'state': s}, w.pool.stats()[s]) for s in ('idle', 'leased')]))
+registry.gauge('xhs_tab_pool_recycled', '标签页池累计回收的标签页数量', lambda: _worker_metrics(
+    lambda w: [({'worker': w.name}, w.pool.stats()['recycled'])]))
+registry.gauge('xhs_browser_navigations', '浏览器本次启动以来的页面导航次数', lambda: _worker_metrics(
+    lambda w: [({'worker': w.name}, w.pool.stats()['navigations'])]))
+registry.gauge('xhs_browser_rss_bytes', '浏览器（含子进程）的内存，需安装psutil', lambda: _worker_metrics(
+    lambda w: [({'worker': w.name}, w.pool.rss_bytes())]))
+registry.gauge('xhs_detail_concurrency', '详情页当前的并发上限', lambda: _worker_metrics(
+    lambda w: [({'worker': w.name}, w.limiter.limit)]))
+registry.gauge('xhs_detail_inflight', '正在获取的详情页数量', lambda: _worker_metrics(
+    lambda w: [({'worker': w.name}, w.limiter.inflight)]))
+registry.gauge('xhs_worker_healthy', '工作单元是否健康（不在安全验证冷却期）', lambda: _worker_metrics(
+    lambda w: [({'worker': w.name}, int(w.healthy))]))
+registry.gauge('xhs_session_ready', '工作单元是否已有搜索会话模板', lambda: _worker_metrics(
+    lambda w: [({'worker': w.name}, int(w.session.ready))]))
+registry.gauge('xhs_breaker_state', '熔断器状态：0-闭合 1-半开 2-断开', lambda: [] if _dispatcher is None else [
+    ({}, ('closed', 'half_open', 'open').index(_dispatcher.breaker.state))])
+registry.gauge('xhs_blocked_requests', '标签页中被拦截的请求数量', lambda: [
+    ({}, get_blocker().stats()['requests'])])
+registry.gauge('xhs_blocked_bytes', '被拦截的请求节省的字节数', lambda: [
+    ({}, get_blocker().stats()['bytes'])])